@@ -1,7 +1,17 @@
+import sys
 from pathlib import Path
 
+from decouple import config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# fileshare_common, shared with proj, lives at the repository root.
+sys.path.append(str(BASE_DIR.parent))
+
+SECRET_KEY = config('SECRET_KEY', default='django-insecure-change-me-in-production')
+DEBUG = config('DEBUG', default=True, cast=bool)
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [h.strip() for h in v.split(',')])
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -14,9 +24,51 @@ INSTALLED_APPS = [
     'fileapp',
 ]
 
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'ez_project.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'ez_project.wsgi.application'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+}
+
+AUTH_USER_MODEL = 'fileapp.User'
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+STATIC_URL = 'static/'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'fileapp.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -36,6 +88,23 @@ BASE_URL = 'http://localhost:8000'  # Change for production
 FRONTEND_URL = 'http://localhost:3000'  # Your frontend URL
 DEFAULT_FROM_EMAIL = 'noreply@filesharing.com'
 
+# Password hashing processes for /api/admin/import-clients/. Kept small since they
+# share the machine with the web workers; `manage.py import_clients` uses every CPU.
+CLIENT_IMPORT_REQUEST_WORKERS = 2
+
 # File upload settings
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB per file
 FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
+
+# Per-process upload admission (fileshare_common.admission). Set WORKER_THREADS to the
+# server's threads per process so DOWNLOAD_RESERVE of them never take uploads.
+UPLOAD_ADMISSION = {
+    'MAX_CONCURRENT': 8,
+    'PER_USER_CONCURRENT': 2,
+    # Compared with the whole request, so leave room for the multipart framing.
+    'PER_USER_BYTES': MAX_UPLOAD_SIZE + 1024 * 1024,
+    'MIN_FREE_BYTES': 2 * 1024 * 1024 * 1024,
+    'WORKER_THREADS': None,
+    'DOWNLOAD_RESERVE': 2,
+}
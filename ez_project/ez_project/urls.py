@@ -9,12 +9,17 @@ urlpatterns = [
     # Ops User
     path('api/ops/login/', views.OpsLoginView.as_view(), name='ops-login'),
     path('api/ops/upload/', views.FileUploadView.as_view(), name='ops-upload'),
+    path('api/ops/grants/', views.FileGrantView.as_view(), name='ops-grant-files'),
+    path('api/ops/grants/revoke/', views.FileGrantView.as_view(revoke=True), name='ops-revoke-files'),
+    # Admin
+    path('api/admin/import-clients/', views.ClientImportView.as_view(), name='admin-import-clients'),
     # Client User
     path('api/client/signup/', views.ClientSignUpView.as_view(), name='client-signup'),
     path('api/client/verify/<str:token>/', views.ClientVerifyEmailView.as_view(), name='client-verify-email'),
     path('api/client/login/', views.ClientLoginView.as_view(), name='client-login'),
     path('api/client/files/', views.FileListView.as_view(), name='client-list-files'),
     path('api/client/download-link/<int:pk>/', views.DownloadFileLinkView.as_view(), name='client-download-link'),
+    path('api/client/download-links/', views.BatchDownloadFileLinkView.as_view(), name='client-download-links'),
     path('api/client/download/<str:token>/', views.DownloadFileView.as_view(), name='client-download-file'),
 ]
 
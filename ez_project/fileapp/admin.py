@@ -1,6 +1,58 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from fileshare_common.admin import LargeTableAdmin, in_batches
 from .models import UserProfile, FileUpload
 
 # Register your models here.
-admin.site.register(UserProfile)
-admin.site.register(FileUpload)
+@admin.register(UserProfile)
+class UserProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'user_type', 'email_verified')
+    list_filter = ('user_type', 'email_verified')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__username',)
+    search_help_text = 'Prefix of the username.'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(user__username__startswith=term), False
+
+
+@admin.register(FileUpload)
+class FileUploadAdmin(LargeTableAdmin):
+    list_display = ('original_filename', 'uploader', 'uploaded_at')
+    list_select_related = ('uploader',)
+    raw_id_fields = ('uploader',)
+    date_hierarchy = 'uploaded_at'
+    search_fields = ('original_filename',)
+    search_help_text = 'Prefix of the file name.'
+    actions = ('delete_with_blobs',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Case-sensitive prefix matches can use the varchar_pattern_ops index.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(original_filename__startswith=term), False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The stock action leaves the files behind on disk.
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Delete selected files and their stored blobs', permissions=['delete'])
+    def delete_with_blobs(self, request, queryset):
+        deleted = 0
+        for batch in in_batches(queryset):
+            names = list(FileUpload.objects.filter(pk__in=batch).values_list('file', flat=True))
+            with transaction.atomic():
+                FileUpload.objects.filter(pk__in=batch).delete()
+            storage = FileUpload._meta.get_field('file').storage
+            for name in names:
+                if name:
+                    storage.delete(name)
+            deleted += len(names)
+        self.message_user(request, f'Deleted {deleted} files.', messages.SUCCESS)
@@ -0,0 +1,28 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from fileshare_common import tokens
+from fileapp.views import decode_encrypted_url, generate_encrypted_url
+
+
+class Command(BaseCommand):
+    help = 'Compare sign/verify cost of compact download tokens against the legacy encrypted URLs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000)
+
+    def handle(self, *args, number, **options):
+        user_id, file_id = 12345, 67890
+        legacy = generate_encrypted_url(user_id, file_id)
+        compact = tokens.sign('download', user_id, file_id, expires_in=600)
+        cases = [
+            ('generate_encrypted_url', lambda: generate_encrypted_url(user_id, file_id)),
+            ('decode_encrypted_url', lambda: decode_encrypted_url(legacy)),
+            ('tokens.sign', lambda: tokens.sign('download', user_id, file_id, expires_in=600)),
+            ('tokens.unsign', lambda: tokens.unsign('download', compact)),
+        ]
+        self.stdout.write(f'token length: legacy={len(legacy)} compact={len(compact)}')
+        for name, func in cases:
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            self.stdout.write(f'{name:<24} {seconds / number * 1e6:8.2f} us/op')
@@ -0,0 +1,7 @@
+from fileshare_common.onboarding import ImportClientsCommand
+
+from fileapp.onboarding import FileappClientImporter
+
+
+class Command(ImportClientsCommand):
+    importer_class = FileappClientImporter
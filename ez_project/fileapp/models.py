@@ -1,5 +1,7 @@
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, Group
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 import uuid
 from datetime import datetime, timedelta
 import hashlib
@@ -70,12 +72,51 @@ def user_directory_path(instance, filename):
     # Files will be uploaded to MEDIA_ROOT/user_<id>/<filename>
     return f'user_{instance.uploader.id}/{filename}'
 
+class FileUploadQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Files granted to ``user`` directly or through one of their groups, as one EXISTS subquery."""
+        return self.filter(Exists(FileAccessGrant.objects.for_user(user).filter(file=OuterRef('pk'))))
+
 class FileUpload(models.Model):
     uploader = models.ForeignKey(User, on_delete=models.CASCADE)
     file = models.FileField(upload_to=user_directory_path)
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)
     original_filename = models.CharField(max_length=255)
 
+    objects = FileUploadQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Prefix (LIKE 'abc%') searches from the admin; opclasses only apply on PostgreSQL.
+            models.Index(fields=['original_filename'], name='fileupload_filename_prefix', opclasses=['varchar_pattern_ops']),
+        ]
+
     def __str__(self):
         return self.original_filename
 
+
+class FileAccessGrantQuerySet(models.QuerySet):
+    def for_user(self, user):
+        memberships = user.groups.through.objects.filter(user_id=user.pk).values('group_id')
+        return self.filter(Q(user=user) | Q(group__in=memberships))
+
+class FileAccessGrant(models.Model):
+    """Lets one client, or every member of a group, see and download a file."""
+    file = models.ForeignKey(FileUpload, on_delete=models.CASCADE, related_name='grants')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='file_grants')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='file_grants')
+    granted_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    granted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = FileAccessGrantQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(user__isnull=False, group__isnull=True) | Q(user__isnull=True, group__isnull=False),
+                name='fileaccessgrant_one_grantee',
+            ),
+            # Grantee first: these double as the indexes behind the visibility check.
+            models.UniqueConstraint(fields=['user', 'file'], condition=Q(user__isnull=False), name='fileaccessgrant_user_file'),
+            models.UniqueConstraint(fields=['group', 'file'], condition=Q(group__isnull=False), name='fileaccessgrant_group_file'),
+        ]
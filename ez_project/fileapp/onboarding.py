@@ -0,0 +1,42 @@
+"""
+Bulk client onboarding for fileapp.
+
+The importer itself is shared with proj (``fileshare_common.onboarding``);
+this module supplies fileapp's users, their client profiles and the
+verification links.
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.urls import reverse
+
+from fileshare_common import tokens
+from fileshare_common.onboarding import CHUNK_SIZE, ClientImporter, open_upload, read_records  # noqa: F401
+
+from .models import UserProfile
+
+User = get_user_model()
+
+
+class FileappClientImporter(ClientImporter):
+    user_model = User
+
+    def build_user(self, username, email):
+        # bulk_create skips User.save(), which would set the verification token.
+        return User(username=username, email=email, user_type='client', email_verification_token=str(uuid.uuid4()))
+
+    def save_users(self, users):
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            UserProfile.objects.bulk_create(UserProfile(user=user, user_type='client') for user in users)
+
+    def verify_url(self, user):
+        token = tokens.sign('verify-email', user.id, expires_in=3600)
+        return self.base_url + reverse('client-verify-email', args=[token])
+
+
+def import_clients(records, chunk_size=CHUNK_SIZE, workers=None, send_email=True, base_url=None):
+    """Create client users from ``records``; return created/skipped counts and per-row errors."""
+    importer = FileappClientImporter(chunk_size=chunk_size, workers=workers, send_email=send_email, base_url=base_url)
+    return importer.run(records)
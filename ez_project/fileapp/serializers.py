@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import authenticate
 from .models import User, UploadedFile, UserProfile, FileUpload
 import os
@@ -39,6 +40,8 @@ class FileUploadSerializer(serializers.ModelSerializer):
                          'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']
         if value.content_type not in allowed_types:
             raise serializers.ValidationError('Only pptx, docx, and xlsx files are allowed.')
+        if value.size > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(f'Files may be at most {settings.MAX_UPLOAD_SIZE // (1024 * 1024)}MB.')
         return value
 
     def create(self, validated_data):
@@ -57,3 +60,15 @@ class FileListSerializer(serializers.ModelSerializer):
         model = UploadedFile
         fields = ['id', 'original_filename', 'file_size', 'uploaded_at', 'uploaded_by_name']
 
+class BatchDownloadLinkSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+
+class FileGrantSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+    usernames = serializers.ListField(child=serializers.CharField(max_length=150), required=False, default=list, max_length=500)
+    groups = serializers.ListField(child=serializers.CharField(max_length=150), required=False, default=list, max_length=100)
+
+    def validate(self, data):
+        if not data['usernames'] and not data['groups']:
+            raise serializers.ValidationError('Give at least one username or group.')
+        return data
@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import FileUpload
+from .utils import auth_header, create_user
+
+DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+@override_settings(UPLOAD_ADMISSION={**settings.UPLOAD_ADMISSION, 'MIN_FREE_BYTES': 0})
+class FileSharingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.ops = create_user('ops', 'ops')
+        self.client_user = create_user('client', 'client')
+        self.stranger = create_user('stranger', 'client')
+
+    def upload(self, name='report.docx', data=b'report', user=None):
+        upload = SimpleUploadedFile(name, data, content_type=DOCX)
+        return self.client.post(reverse('ops-upload'), {'file': upload}, headers=auth_header(user or self.ops))
+
+    def grant(self, file_id, revoke=False, **grantees):
+        response = self.client.post(
+            reverse('ops-revoke-files' if revoke else 'ops-grant-files'), {'ids': [file_id], **grantees},
+            content_type='application/json', headers=auth_header(self.ops),
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def listed(self, user):
+        response = self.client.get(reverse('client-list-files'), headers=auth_header(user))
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()]
+
+    def download_link(self, user, file_id):
+        return self.client.get(reverse('client-download-link', args=[file_id]), headers=auth_header(user))
+
+    def test_only_ops_users_upload(self):
+        self.assertEqual(self.upload(user=self.client_user).status_code, 403)
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(FileUpload.objects.get().file.read(), b'report')
+
+    def test_clients_only_see_granted_files(self):
+        file_id = self.upload().json()['id']
+        self.assertEqual(self.listed(self.client_user), [])
+        self.assertEqual(self.download_link(self.client_user, file_id).status_code, 404)
+
+        summary = self.grant(file_id, usernames=['client', 'nobody'])
+        self.assertEqual(summary['missing']['usernames'], ['nobody'])
+        self.assertEqual(self.listed(self.client_user), [file_id])
+        self.assertEqual(self.listed(self.stranger), [])
+        link = self.download_link(self.client_user, file_id).json()['download-link']
+        response = self.client.get(link, headers=auth_header(self.client_user))
+        self.assertEqual(b''.join(response.streaming_content), b'report')
+        # Links are personal.
+        self.assertEqual(self.client.get(link, headers=auth_header(self.stranger)).status_code, 403)
+
+    def test_group_grants_and_revocation_void_links(self):
+        file_id = self.upload().json()['id']
+        self.client_user.groups.add(Group.objects.create(name='team'))
+        self.grant(file_id, groups=['team'])
+        link = self.download_link(self.client_user, file_id).json()['download-link']
+        self.grant(file_id, revoke=True, groups=['team'])
+        self.assertEqual(self.listed(self.client_user), [])
+        self.assertEqual(self.client.get(link, headers=auth_header(self.client_user)).status_code, 404)
+
+    def test_batch_links_skip_files_not_granted(self):
+        granted, hidden = self.upload().json()['id'], self.upload('other.docx').json()['id']
+        self.grant(granted, usernames=['client'])
+        response = self.client.post(
+            reverse('client-download-links'), {'ids': [granted, hidden]},
+            content_type='application/json', headers=auth_header(self.client_user),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['download-links']), [str(granted)])
+        self.assertEqual(response.json()['missing'], [hidden])
+
+    def test_upload_admission_limits(self):
+        with override_settings(UPLOAD_ADMISSION={'MIN_FREE_BYTES': 0, 'PER_USER_BYTES': 4}):
+            self.assertEqual(self.upload().status_code, 413)
+        with override_settings(UPLOAD_ADMISSION={'MIN_FREE_BYTES': 2 ** 62}):
+            response = self.upload()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(FileUpload.objects.exists())
+
+    def test_largest_allowed_file_fits_with_its_multipart_framing(self):
+        limit = settings.MAX_UPLOAD_SIZE
+        self.assertEqual(self.upload(data=bytes(limit)).status_code, 201)
+        response = self.upload(data=bytes(limit + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json())
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from ..models import UserProfile
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    # Spawned hashing workers would not see the faster hasher.
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    CLIENT_IMPORT_REQUEST_WORKERS=1,
+)
+class ImportClientsTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.auth = {'Authorization': f'Token {Token.objects.create(user=admin).key}'}
+
+    def test_endpoint_creates_clients_with_profiles(self):
+        lines = (
+            b'{"username": "alice", "email": "alice@example.com", "password": "A-long-enough-pw-42"}\n'
+            b'{"username": "broken"\n'
+            b'["not", "an", "object"]\n'
+            b'{"username": "bob", "email": "bob@example.com"}\n'
+        )
+        response = self.client.post(
+            reverse('admin-import-clients'), {'file': SimpleUploadedFile('clients.jsonl', lines)}, headers=self.auth
+        )
+        self.assertEqual(response.status_code, 201)
+        summary = response.json()
+        self.assertEqual((summary['created'], summary['skipped']), (2, 0))
+        self.assertEqual([error['row'] for error in summary['errors']], [2, 3])
+
+        alice = User.objects.get(username='alice')
+        self.assertEqual(alice.user_type, 'client')
+        self.assertTrue(alice.email_verification_token)
+        self.assertTrue(alice.check_password('A-long-enough-pw-42'))
+        self.assertEqual(
+            list(UserProfile.objects.filter(user__username__in=['alice', 'bob']).values_list('user_type', 'email_verified')),
+            [('client', False), ('client', False)],
+        )
+
+        # The emailed link verifies the account.
+        message = next(message for message in mail.outbox if message.to == ['alice@example.com'])
+        link = urlsplit(message.body.split(': ', 1)[1])
+        self.assertEqual(self.client.get(link.path).status_code, 200)
+        self.assertTrue(UserProfile.objects.get(user=alice).email_verified)
+
+    def test_endpoint_requires_staff(self):
+        client = User.objects.create_user('client', 'client@example.com', 'pw')
+        response = self.client.post(
+            reverse('admin-import-clients'), {'file': SimpleUploadedFile('clients.csv', b'username,email\n')},
+            headers={'Authorization': f'Token {Token.objects.create(user=client).key}'},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_skips_existing_usernames(self):
+        User.objects.create_user('alice', 'alice@example.com', 'pw')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('username,email\nalice,alice@example.com\ncarol,carol@example.com\n')
+        self.addCleanup(os.remove, handle.name)
+        out = io.StringIO()
+        call_command('import_clients', handle.name, '--workers', '1', '--no-email', stdout=out)
+        self.assertIn('Created 1 clients, skipped 1 existing, 0 invalid.', out.getvalue())
+        self.assertTrue(UserProfile.objects.filter(user__username='carol', user_type='client').exists())
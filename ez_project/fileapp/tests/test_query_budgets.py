@@ -0,0 +1,165 @@
+"""
+Query budgets for every endpoint in ez_project/urls.py; see fileshare_common.testing.
+"""
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from fileshare_common import tokens
+from fileshare_common.admission import admission
+from fileshare_common.testing import QueryBudgetMixin
+
+from ..models import FileAccessGrant, FileUpload
+from .utils import auth_header, create_user
+
+User = get_user_model()
+
+BUDGETS = {
+    'admin': 6,
+    'admin-import-clients': 6,
+    'ops-login': 6,
+    'ops-upload': 2,
+    'ops-grant-files': 4,
+    'ops-revoke-files': 4,
+    'client-signup': 5,
+    'client-verify-email': 3,
+    'client-login': 6,
+    'client-list-files': 2,
+    'client-download-link': 2,
+    'client-download-links': 2,
+    'client-download-file': 2,
+}
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    budgets = BUDGETS
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            UPLOAD_ADMISSION={'MIN_FREE_BYTES': 0},
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def seed(self, scale):
+        self.ops = create_user('ops', 'ops')
+        self.client_user = create_user('client', 'client', email_verified=True)
+        self.files = [
+            FileUpload.objects.create(
+                uploader=self.ops, file=ContentFile(b'x' * 64, name=f'report{i}.docx'),
+                original_filename=f'report{i}.docx',
+            )
+            for i in range(scale)
+        ]
+        FileAccessGrant.objects.bulk_create(
+            FileAccessGrant(file=upload, user=self.client_user) for upload in self.files
+        )
+
+    # One method per URL name; each prepares its request and returns a callable that makes it.
+
+    def call_admin(self, scale):
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+        return lambda: self.client.get(reverse('admin:fileapp_fileupload_changelist'))
+
+    def call_admin_import_clients(self, scale):
+        headers = auth_header(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+        rows = ''.join(f'imported{i},imported{i}@example.com\n' for i in range(scale))
+        upload = SimpleUploadedFile('clients.csv', ('username,email\n' + rows).encode())
+        return lambda: self.client.post(reverse('admin-import-clients'), {'file': upload}, headers=headers)
+
+    def call_ops_login(self, scale):
+        return lambda: self.client.post(reverse('ops-login'), {'username': 'ops', 'password': 'pw'})
+
+    def call_ops_upload(self, scale):
+        upload = SimpleUploadedFile(
+            'new.docx', b'x' * 64,
+            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        )
+        headers = auth_header(self.ops)
+        return lambda: self.client.post(reverse('ops-upload'), {'file': upload}, headers=headers)
+
+    def _grant_data(self, scale):
+        for i in range(scale):
+            create_user(f'grantee{i}', 'client')
+        return {
+            'ids': [upload.pk for upload in self.files],
+            'usernames': [f'grantee{i}' for i in range(scale)],
+        }
+
+    def call_ops_grant_files(self, scale):
+        data, headers = self._grant_data(scale), auth_header(self.ops)
+        return lambda: self.client.post(
+            reverse('ops-grant-files'), data, content_type='application/json', headers=headers
+        )
+
+    def call_ops_revoke_files(self, scale):
+        data, headers = self._grant_data(scale), auth_header(self.ops)
+        return lambda: self.client.post(
+            reverse('ops-revoke-files'), data, content_type='application/json', headers=headers
+        )
+
+    def call_client_signup(self, scale):
+        data = {'username': 'newclient', 'email': 'new@example.com', 'password': 'pw', 'user_type': 'client'}
+        return lambda: self.client.post(reverse('client-signup'), data)
+
+    def call_client_verify_email(self, scale):
+        token = tokens.sign('verify-email', self.client_user.pk, expires_in=3600)
+        return lambda: self.client.get(reverse('client-verify-email', args=[token]))
+
+    def call_client_login(self, scale):
+        return lambda: self.client.post(reverse('client-login'), {'username': 'client', 'password': 'pw'})
+
+    def call_client_list_files(self, scale):
+        headers = auth_header(self.client_user)
+        return lambda: self.client.get(reverse('client-list-files'), headers=headers)
+
+    def call_client_download_link(self, scale):
+        headers = auth_header(self.client_user)
+        return lambda: self.client.get(reverse('client-download-link', args=[self.files[-1].pk]), headers=headers)
+
+    def call_client_download_links(self, scale):
+        data, headers = {'ids': [upload.pk for upload in self.files]}, auth_header(self.client_user)
+        return lambda: self.client.post(
+            reverse('client-download-links'), data, content_type='application/json', headers=headers
+        )
+
+    def call_client_download_file(self, scale):
+        token = tokens.sign('download', self.client_user.pk, self.files[-1].pk, expires_in=600)
+        headers = auth_header(self.client_user)
+        return lambda: self.client.get(reverse('client-download-file', args=[token]), headers=headers)
+
+    def test_upload_with_project_settings(self):
+        # The budgets run against a temporary MEDIA_ROOT with admission relaxed;
+        # this upload goes through the settings the project actually ships with.
+        self.settings_override.disable()
+        self.addCleanup(self.settings_override.enable)
+        ops = create_user('ops', 'ops')
+        upload = SimpleUploadedFile(
+            'new.docx', b'x' * 64,
+            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        )
+        config = admission.config()
+        response = self.client.post(reverse('ops-upload'), {'file': upload}, headers=auth_header(ops))
+        if admission._free_bytes() - config['MIN_FREE_BYTES'] > 1024 * 1024:
+            self.assertEqual(response.status_code, 201, response.content)
+            stored = FileUpload.objects.get(pk=response.json()['id']).file
+            self.addCleanup(stored.delete, save=False)
+            self.assertTrue(stored.storage.exists(stored.name))
+            self.assertTrue(stored.path.startswith(str(settings.MEDIA_ROOT)))
+        else:
+            self.assertEqual(response.status_code, 503)
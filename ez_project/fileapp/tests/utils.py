@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+
+from ..models import UserProfile
+
+User = get_user_model()
+
+
+def auth_header(user):
+    return {'Authorization': f'Token {Token.objects.get_or_create(user=user)[0].key}'}
+
+
+def create_user(username, user_type, **profile):
+    """A user with the profile that carries its ops/client type."""
+    user = User.objects.create_user(username, f'{username}@example.com', 'pw', user_type=user_type)
+    UserProfile.objects.create(user=user, user_type=user_type, **profile)
+    return user
@@ -1,9 +1,11 @@
 from rest_framework import generics, status, permissions, views
 from rest_framework.response import Response
-from django.contrib.auth.models import User
-from .models import UserProfile, FileUpload
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from .models import UserProfile, FileUpload, FileAccessGrant
 from .serializers import (
-    UserRegistrationSerializer, UserLoginSerializer, FileUploadSerializer, UserProfileSerializer
+    UserRegistrationSerializer, UserLoginSerializer, FileUploadSerializer, UserProfileSerializer,
+    BatchDownloadLinkSerializer, FileGrantSerializer
 )
 from rest_framework.authtoken.models import Token
 from django.core.mail import send_mail
@@ -11,14 +13,20 @@ from django.conf import settings
 from django.urls import reverse
 from django.utils.crypto import get_random_string
 from django.shortcuts import get_object_or_404
+from django.db.models import Q
 from django.http import FileResponse, Http404
+from django.core.signing import BadSignature, SignatureExpired
 from rest_framework.parsers import MultiPartParser, FormParser
+from fileshare_common import tokens
+from fileshare_common.admission import UploadAdmissionMixin
 import base64
 import hashlib
 import hmac
 import time
 
-# Helper for encrypted URL
+User = get_user_model()
+
+# Legacy link format, still accepted until links issued with it have expired
 def generate_encrypted_url(user_id, file_id, secret=None, expires_in=600):
     if not secret:
         secret = settings.SECRET_KEY
@@ -44,6 +52,12 @@ def decode_encrypted_url(token, secret=None):
     except Exception:
         return None
 
+def read_link_token(purpose, token):
+    try:
+        return tokens.unsign(purpose, token)
+    except (BadSignature, SignatureExpired):
+        return decode_encrypted_url(token)
+
 # Permissions
 class IsOpsUser(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -55,6 +69,8 @@ class IsClientUser(permissions.BasePermission):
 
 # Ops User: Login
 class OpsLoginView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -65,7 +81,7 @@ class OpsLoginView(views.APIView):
         return Response({'token': token.key})
 
 # Ops User: Upload File
-class FileUploadView(generics.CreateAPIView):
+class FileUploadView(UploadAdmissionMixin, generics.CreateAPIView):
     serializer_class = FileUploadSerializer
     permission_classes = [permissions.IsAuthenticated, IsOpsUser]
     parser_classes = [MultiPartParser, FormParser]
@@ -73,9 +89,71 @@ class FileUploadView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(uploader=self.request.user)
 
+# Ops User: Grant or revoke client (or group) access to files
+class FileGrantView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated, IsOpsUser]
+    revoke = False
+
+    def post(self, request):
+        serializer = FileGrantSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        files = set(FileUpload.objects.filter(pk__in=data['ids']).values_list('pk', flat=True))
+        users = dict(
+            User.objects.filter(username__in=data['usernames'], userprofile__user_type='client')
+            .values_list('username', 'pk')
+        )
+        groups = dict(Group.objects.filter(name__in=data['groups']).values_list('name', 'pk'))
+        if self.revoke:
+            FileAccessGrant.objects.filter(file_id__in=files).filter(
+                Q(user_id__in=users.values()) | Q(group_id__in=groups.values())
+            ).delete()
+        else:
+            grantees = [{'user_id': pk} for pk in users.values()] + [{'group_id': pk} for pk in groups.values()]
+            FileAccessGrant.objects.bulk_create(
+                [FileAccessGrant(file_id=file_id, granted_by=request.user, **grantee) for file_id in files for grantee in grantees],
+                batch_size=1000, ignore_conflicts=True,
+            )
+        return Response({
+            'files': len(files),
+            'usernames': len(users),
+            'groups': len(groups),
+            'missing': {
+                'ids': [file_id for file_id in data['ids'] if file_id not in files],
+                'usernames': [name for name in data['usernames'] if name not in users],
+                'groups': [name for name in data['groups'] if name not in groups],
+            },
+            'message': 'success',
+        })
+
+# Admin: Bulk Client Import
+class ClientImportView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        # Imported on first use: pulls in multiprocessing and the mail stack.
+        from .onboarding import import_clients, open_upload, read_records
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload a .csv or .jsonl file as "file".'}, status=400)
+        stream, fmt = open_upload(upload)
+        try:
+            summary = import_clients(
+                read_records(stream, fmt),
+                workers=settings.CLIENT_IMPORT_REQUEST_WORKERS,
+                send_email=request.data.get('send_email', 'true').lower() != 'false',
+                base_url=request.build_absolute_uri('/'),
+            )
+        except ValueError as exc:
+            return Response({'error': f'Could not read import file: {exc}'}, status=400)
+        return Response(summary, status=201)
+
 # Client User: Sign Up
 class ClientSignUpView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
+    permission_classes = [permissions.AllowAny]
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -84,7 +162,7 @@ class ClientSignUpView(generics.CreateAPIView):
         if profile.user_type != 'client':
             return Response({'error': 'Only client users can sign up here.'}, status=400)
         # Generate encrypted URL
-        token = generate_encrypted_url(user.id, 0, expires_in=3600)
+        token = tokens.sign('verify-email', user.id, expires_in=3600)
         verify_url = request.build_absolute_uri(reverse('client-verify-email', args=[token]))
         # Send email (console backend)
         send_mail(
@@ -97,12 +175,13 @@ class ClientSignUpView(generics.CreateAPIView):
 
 # Client User: Email Verify
 class ClientVerifyEmailView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
     def get(self, request, token):
-        result = decode_encrypted_url(token)
+        result = read_link_token('verify-email', token)
         if not result:
             return Response({'error': 'Invalid or expired link.'}, status=400)
-        user_id, _ = result
-        user = get_object_or_404(User, id=user_id)
+        user = get_object_or_404(User, id=result[0])
         profile = user.userprofile
         profile.email_verified = True
         profile.save()
@@ -110,6 +189,8 @@ class ClientVerifyEmailView(views.APIView):
 
 # Client User: Login
 class ClientLoginView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -127,30 +208,52 @@ class FileListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsClientUser]
 
     def get_queryset(self):
-        return FileUpload.objects.all()
+        return FileUpload.objects.visible_to(self.request.user)
 
 # Client User: Download File (returns encrypted URL)
 class DownloadFileLinkView(views.APIView):
     permission_classes = [permissions.IsAuthenticated, IsClientUser]
 
     def get(self, request, pk):
-        file = get_object_or_404(FileUpload, pk=pk)
-        token = generate_encrypted_url(request.user.id, file.id, expires_in=600)
+        file = get_object_or_404(FileUpload.objects.visible_to(request.user), pk=pk)
+        token = tokens.sign('download', request.user.id, file.id, expires_in=600)
         download_url = request.build_absolute_uri(reverse('client-download-file', args=[token]))
         return Response({'download-link': download_url, 'message': 'success'})
 
+# Client User: Download links for many files at once
+class BatchDownloadFileLinkView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated, IsClientUser]
+
+    def post(self, request):
+        serializer = BatchDownloadLinkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = serializer.validated_data['ids']
+        found = set(
+            FileUpload.objects.visible_to(request.user).filter(pk__in=requested).values_list('pk', flat=True)
+        )
+        # Build the URL prefix once; tokens are URL-safe and need no quoting.
+        placeholder = reverse('client-download-file', args=['token'])
+        prefix = request.build_absolute_uri(placeholder[:-len('token/')])
+        links = {
+            file_id: f"{prefix}{tokens.sign('download', request.user.id, file_id, expires_in=600)}/"
+            for file_id in sorted(found)
+        }
+        missing = [file_id for file_id in requested if file_id not in found]
+        return Response({'download-links': links, 'missing': missing, 'message': 'success'})
+
 # Actual file download endpoint
 class DownloadFileView(views.APIView):
     permission_classes = [permissions.IsAuthenticated, IsClientUser]
 
     def get(self, request, token):
-        result = decode_encrypted_url(token)
-        if not result:
+        result = read_link_token('download', token)
+        if not result or len(result) != 2:
             return Response({'error': 'Invalid or expired link.'}, status=400)
         user_id, file_id = result
         if request.user.id != user_id or not hasattr(request.user, 'userprofile') or request.user.userprofile.user_type != 'client':
             return Response({'error': 'Access denied.'}, status=403)
-        file = get_object_or_404(FileUpload, pk=file_id)
+        # Checked again here so that revoking a grant also voids links already handed out.
+        file = get_object_or_404(FileUpload.objects.visible_to(request.user), pk=file_id)
         response = FileResponse(file.file.open('rb'), as_attachment=True, filename=file.original_filename)
         return response
 
@@ -0,0 +1,5 @@
+"""
+Code shared by the two Django projects in this repository, ``proj`` and
+``ez_project``. Both projects' settings put the repository root on
+``sys.path`` so it can be imported as ``fileshare_common``.
+"""
@@ -0,0 +1,48 @@
+"""
+Admin helpers for tables too large for the stock changelist and actions,
+shared by ``proj`` and ``ez_project``.
+"""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ACTION_BATCH_SIZE = 500
+
+
+class EstimatedCountPaginator(Paginator):
+    """Use the planner's row estimate instead of COUNT(*) for large unfiltered tables on PostgreSQL."""
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.threshold:
+                return row[0]
+        return super().count
+
+
+def in_batches(queryset, size=ACTION_BATCH_SIZE):
+    """Yield lists of primary keys from ``queryset`` using keyset pagination."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        batch = list((pks if last is None else pks.filter(pk__gt=last))[:size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist without full-table counts; list it before other ModelAdmin bases."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,138 @@
+"""
+Admission control for uploads, shared by ``proj`` and ``ez_project``.
+
+Uploads are admitted after authentication but before the request body is
+read, based on the declared ``Content-Length``. Each worker process enforces
+a global and a per-user budget of concurrent uploads and in-flight bytes,
+keeps ``DOWNLOAD_RESERVE`` of its ``WORKER_THREADS`` free for everything
+else, and refuses bodies that would leave less than ``MIN_FREE_BYTES`` on
+the upload temp directory or the volume holding ``default_storage``. Saturation answers 429 (this user) or 503 (the
+server) with ``Retry-After``, so clients back off instead of piling up.
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+DEFAULTS = {
+    'MAX_CONCURRENT': 8,
+    'MAX_BYTES': 1024 * 1024 * 1024,
+    'PER_USER_CONCURRENT': 2,
+    'PER_USER_BYTES': 200 * 1024 * 1024,
+    'MIN_FREE_BYTES': 2 * 1024 * 1024 * 1024,
+    'WORKER_THREADS': None,
+    'DOWNLOAD_RESERVE': 2,
+    'RETRY_AFTER': 5,
+}
+
+
+class ServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many uploads in progress, try again later.'
+    default_code = 'upload_capacity'
+
+    def __init__(self, detail=None, wait=None):
+        super().__init__(detail)
+        self.wait = wait
+
+
+class LengthRequired(APIException):
+    status_code = status.HTTP_411_LENGTH_REQUIRED
+    default_detail = 'Uploads must declare a Content-Length.'
+    default_code = 'length_required'
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Upload is larger than the per-user limit.'
+    default_code = 'payload_too_large'
+
+
+def _existing_parent(path):
+    # The media directory is only created by the first upload.
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+class UploadAdmission:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.in_flight = 0
+        self.per_user = {}
+
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'UPLOAD_ADMISSION', {})}
+
+    def max_concurrent(self, config):
+        limit = config['MAX_CONCURRENT']
+        if config['WORKER_THREADS']:
+            limit = min(limit, config['WORKER_THREADS'] - config['DOWNLOAD_RESERVE'])
+        return max(limit, 1)
+
+    def _free_bytes(self):
+        paths = {
+            _existing_parent(getattr(default_storage, 'location', settings.MEDIA_ROOT)),
+            getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None) or tempfile.gettempdir(),
+        }
+        return min(shutil.disk_usage(path).free for path in paths)
+
+    def acquire(self, user_id, length):
+        """Reserve room for an upload of ``length`` bytes or raise an APIException."""
+        config = self.config()
+        retry_after = config['RETRY_AFTER']
+        if length is None:
+            raise LengthRequired()
+        if length > config['PER_USER_BYTES']:
+            raise PayloadTooLarge()
+        with self._lock:
+            user_count, user_bytes = self.per_user.get(user_id, (0, 0))
+            if user_count >= config['PER_USER_CONCURRENT'] or user_bytes + length > config['PER_USER_BYTES']:
+                raise Throttled(wait=retry_after, detail='Too many uploads in progress for this user.')
+            if self.active >= self.max_concurrent(config) or self.in_flight + length > config['MAX_BYTES']:
+                raise ServiceUnavailable(wait=retry_after)
+            # Bytes already admitted have not all hit the disk yet.
+            if self._free_bytes() - self.in_flight - length < config['MIN_FREE_BYTES']:
+                raise ServiceUnavailable('Not enough disk space for uploads, try again later.', wait=retry_after * 12)
+            self.active += 1
+            self.in_flight += length
+            self.per_user[user_id] = (user_count + 1, user_bytes + length)
+        return user_id, length
+
+    def release(self, ticket):
+        user_id, length = ticket
+        with self._lock:
+            self.active -= 1
+            self.in_flight -= length
+            user_count, user_bytes = self.per_user.pop(user_id)
+            if user_count > 1:
+                self.per_user[user_id] = (user_count - 1, user_bytes - length)
+
+
+admission = UploadAdmission()
+
+
+class UploadAdmissionMixin:
+    """Admit the upload after authentication and permissions, before the body is parsed."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            length = None
+        self.admission_ticket = admission.acquire(request.user.pk, length)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        ticket = getattr(self, 'admission_ticket', None)
+        if ticket is not None:
+            self.admission_ticket = None
+            admission.release(ticket)
+        return super().finalize_response(request, response, *args, **kwargs)
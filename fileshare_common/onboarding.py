@@ -0,0 +1,238 @@
+"""
+Bulk client onboarding, shared by ``proj`` and ``ez_project``.
+
+Reads client records (``username``, ``email`` and optional ``password``) from
+a CSV or JSON-lines stream and creates them chunk by chunk: one query to find
+usernames that already exist, password hashing spread over a process pool,
+one ``bulk_create`` and one mail connection for the verification emails.
+Records without a password get an unusable one. Rows that cannot be read or
+fail validation are reported by row number and the rest are still imported.
+
+Each project subclasses ``ClientImporter`` for its user rows and verification
+links, and ``ImportClientsCommand`` for its ``import_clients`` command.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+CHUNK_SIZE = 1000
+
+
+class InvalidRecord(dict):
+    """Stands in for a row that could not be read, so later row numbers stay right."""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+
+def read_records(stream, fmt):
+    """Yield dicts from a text stream of CSV (with a header row) or JSON lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                record = InvalidRecord(f'Invalid CSV: {exc}')
+            yield record
+    elif fmt == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                record = InvalidRecord(f'Invalid JSON: {exc}')
+            if not isinstance(record, dict):
+                record = InvalidRecord('Each line must be a JSON object.')
+            yield record
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def open_upload(upload):
+    """Return (text stream, format) for an uploaded .csv/.jsonl file."""
+    fmt = 'jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else 'csv'
+    return io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), fmt
+
+
+def _text(record, field, strip=True):
+    value = record.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValidationError(f'{field} must be a string.')
+    return value.strip() if strip else value
+
+
+def _username(record):
+    value = record.get('username')
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _init_worker():
+    # Workers are spawned, not forked, so they start without Django.
+    django.setup()
+
+
+class ClientImporter:
+    """
+    Create client users from records; subclasses set ``user_model`` and
+    implement ``build_user`` and ``verify_url``.
+
+    Passwords are hashed in ``workers`` processes, started only once a chunk
+    has passwords to hash. ``workers=1`` hashes in the calling process. The
+    pool uses the spawn start method, since forking a threaded web worker can
+    leave locks held in the child.
+    """
+    user_model = None
+
+    def __init__(self, chunk_size=CHUNK_SIZE, workers=None, send_email=True, base_url=None):
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.send_email = send_email
+        self.base_url = (base_url or settings.BASE_URL).rstrip('/')
+        self._pool = None
+
+    def build_user(self, username, email):
+        """Return an unsaved client user."""
+        raise NotImplementedError
+
+    def verify_url(self, user):
+        """Return the email verification link for a saved ``user``."""
+        raise NotImplementedError
+
+    def save_users(self, users):
+        with transaction.atomic():
+            self.user_model.objects.bulk_create(users)
+
+    def run(self, records):
+        """Import ``records``; return created/skipped counts and per-row errors."""
+        summary = {'created': 0, 'skipped': 0, 'errors': []}
+        records = iter(records)
+        row = 0
+        try:
+            while True:
+                chunk = list(islice(records, self.chunk_size))
+                if not chunk:
+                    break
+                names = [_username(record) for record in chunk]
+                # Existing usernames (and repeats within the import) are skipped, not errors.
+                seen = set(self.user_model.objects.filter(username__in=names).values_list('username', flat=True))
+                users, passwords = [], []
+                for username, record in zip(names, chunk):
+                    row += 1
+                    if isinstance(record, InvalidRecord):
+                        summary['errors'].append({'row': row, 'errors': [record.error]})
+                        continue
+                    if username in seen:
+                        summary['skipped'] += 1
+                        continue
+                    try:
+                        user, password = self._validate(username, record)
+                    except ValidationError as exc:
+                        summary['errors'].append({'row': row, 'errors': exc.messages})
+                        continue
+                    seen.add(username)
+                    users.append(user)
+                    passwords.append(password)
+                if not users:
+                    continue
+                for user, password in zip(users, self._hash(passwords)):
+                    user.password = password
+                self.save_users(users)
+                summary['created'] += len(users)
+                if self.send_email:
+                    self._send_verification_emails(users)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        return summary
+
+    def _validate(self, username, record):
+        _text(record, 'username')
+        email = _text(record, 'email')
+        password = _text(record, 'password', strip=False) or None
+        if not username or not email:
+            raise ValidationError('username and email are required.')
+        user = self.build_user(username, email)
+        user.clean_fields(exclude=['password'])
+        if password:
+            validate_password(password, user)
+        return user, password
+
+    def _hash(self, passwords):
+        # Unusable passwords (no password given) cost nothing to make.
+        slow = [password for password in passwords if password]
+        if self.workers <= 1 or not slow:
+            return [make_password(password) for password in passwords]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        hashed = iter(self._pool.map(make_password, slow, chunksize=max(len(slow) // (4 * self.workers), 1)))
+        return [next(hashed) if password else make_password(None) for password in passwords]
+
+    def _send_verification_emails(self, users):
+        messages = [
+            EmailMessage(
+                'Verify your email',
+                f'Click to verify: {self.verify_url(user)}',
+                settings.DEFAULT_FROM_EMAIL,
+                [user.email],
+            )
+            for user in users
+        ]
+        connection = get_connection(fail_silently=True)
+        connection.send_messages(messages)
+
+
+class ImportClientsCommand(BaseCommand):
+    """``import_clients`` management command; subclasses set ``importer_class``."""
+    help = 'Create client users in bulk from a CSV (username,email,password) or JSON-lines file.'
+    importer_class = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count).')
+        parser.add_argument('--no-email', action='store_true', help='Do not send verification emails.')
+
+    def handle(self, *args, path, format, chunk_size, workers, no_email, **options):
+        fmt = format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        except OSError as exc:
+            raise CommandError(exc)
+        importer = self.importer_class(chunk_size=chunk_size, workers=workers, send_email=not no_email)
+        with stream:
+            try:
+                summary = importer.run(read_records(stream, fmt))
+            except ValueError as exc:
+                raise CommandError(f'Could not read import file: {exc}')
+        for error in summary['errors']:
+            self.stderr.write(f"row {error['row']}: {' '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary['created']} clients, skipped {summary['skipped']} existing, "
+            f"{len(summary['errors'])} invalid."
+        ))
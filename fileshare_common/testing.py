@@ -0,0 +1,76 @@
+"""
+Query-budget test harness, shared by ``proj`` and ``ez_project``.
+
+Each endpoint is requested against data seeded at every size in ``scales``.
+Its query count must be the same at each size, so no query runs once per
+row, and must stay within its budget. On failure the SQL of the largest run
+is printed, with statements that grew with the data marked. A URL added
+without a budget fails ``test_every_url_has_a_budget``.
+"""
+import re
+from collections import Counter
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\d+|\bNULL\b")
+# IN (...) lists and multi-row VALUES are one statement however long they get.
+_LISTS = re.compile(r"\([?, ]*\)(?:, \([?, ]*\))*")
+
+
+def _shape(sql):
+    return _LISTS.sub('(...)', _LITERALS.sub('?', sql))
+
+
+def budget_report(name, budget, runs):
+    """Explain a failed budget: counts per scale, then the largest run's SQL."""
+    counts = {scale: len(queries) for scale, queries in runs.items()}
+    small, large = runs[min(runs)], runs[max(runs)]
+    grown = Counter(_shape(q['sql']) for q in large) - Counter(_shape(q['sql']) for q in small)
+    lines = [f'{name}: {counts} queries by scale, budget {budget}.']
+    for i, query in enumerate(large, 1):
+        marker = '  <-- grows with data' if _shape(query['sql']) in grown else ''
+        lines.append(f"{i:3}. {query['sql']}{marker}")
+    return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """
+    Mix into a TestCase; set ``budgets`` ({URL name: queries}), implement
+    ``seed(scale)`` and one ``call_<url_name>(scale)`` per URL that prepares
+    its request and returns a callable that makes it.
+    """
+    budgets = {}
+    scales = (2, 12)
+
+    def seed(self, scale):
+        raise NotImplementedError
+
+    def consume(self, name, response):
+        """Read the response so streamed bodies run their queries too."""
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def measure(self, name, scale):
+        """Seed ``scale`` rows, make the request and return the queries it ran; the data is rolled back."""
+        with transaction.atomic():
+            self.seed(scale)
+            request = getattr(self, 'call_' + name.replace('-', '_'))(scale)
+            with CaptureQueriesContext(connection) as captured:
+                response = request()
+                self.consume(name, response)
+            self.assertLess(response.status_code, 400, f'{name} answered {response.status_code}')
+            transaction.set_rollback(True)
+        return captured.captured_queries
+
+    def test_every_url_has_a_budget(self):
+        names = {getattr(pattern, 'name', None) or str(pattern.pattern).strip('/') for pattern in get_resolver().url_patterns}
+        self.assertEqual(names, set(self.budgets))
+
+    def test_query_budgets(self):
+        for name, budget in self.budgets.items():
+            with self.subTest(endpoint=name):
+                runs = {scale: self.measure(name, scale) for scale in self.scales}
+                counts = {len(queries) for queries in runs.values()}
+                self.assertTrue(len(counts) == 1 and max(counts) <= budget, budget_report(name, budget, runs))
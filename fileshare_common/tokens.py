@@ -0,0 +1,120 @@
+"""
+Compact signed tokens for download and email verification links.
+
+A token is the URL-safe base64 (without padding) of::
+
+    version (1 byte) | key id (1 byte) | expires (4 bytes, unix time)
+    | fields (unsigned varints) | MAC (12 bytes)
+
+The MAC is HMAC-SHA256 over the token purpose and every byte before it,
+truncated to 96 bits. Keys come from ``TOKEN_SIGNING_KEYS`` (``{key_id:
+secret}``, ids 0-255) and new tokens are signed with ``TOKEN_ACTIVE_KEY_ID``.
+To rotate, add a key, make it active, and remove the old one after its links
+have expired. Derived keys and keyed HMAC states are cached per process.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.core.signing import BadSignature, SignatureExpired
+from django.dispatch import receiver
+from django.utils.encoding import force_bytes
+
+VERSION = 1
+MAC_SIZE = 12
+_HEADER = struct.Struct('>BBI')
+
+_keyring = None
+_keyed = {}
+
+
+def _load_keyring():
+    global _keyring
+    if _keyring is None:
+        keys = getattr(settings, 'TOKEN_SIGNING_KEYS', None) or {1: settings.SECRET_KEY}
+        derived = {
+            int(key_id): hashlib.sha256(b'fileshare.tokens:' + force_bytes(secret)).digest()
+            for key_id, secret in keys.items()
+        }
+        active = int(getattr(settings, 'TOKEN_ACTIVE_KEY_ID', None) or max(derived))
+        if active not in derived or not all(0 <= key_id <= 255 for key_id in derived):
+            raise ValueError('TOKEN_ACTIVE_KEY_ID must name a key in TOKEN_SIGNING_KEYS with ids 0-255.')
+        _keyring = (active, derived)
+    return _keyring
+
+
+@receiver(setting_changed)
+def _reset_keyring(setting, **kwargs):
+    global _keyring
+    if setting in ('SECRET_KEY', 'TOKEN_SIGNING_KEYS', 'TOKEN_ACTIVE_KEY_ID'):
+        _keyring = None
+        _keyed.clear()
+
+
+def _mac(key_id, purpose, body):
+    state = _keyed.get((key_id, purpose))
+    if state is None:
+        _, keys = _load_keyring()
+        state = hmac.new(keys[key_id], purpose.encode() + b'\0', hashlib.sha256)
+        _keyed[(key_id, purpose)] = state
+    mac = state.copy()
+    mac.update(body)
+    return mac.digest()[:MAC_SIZE]
+
+
+def _encode_varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    if shift:
+        raise BadSignature('Truncated token payload')
+    return tuple(values)
+
+
+def sign(purpose, *fields, expires_in):
+    """Return a token for the non-negative integers ``fields``, valid for ``expires_in`` seconds."""
+    key_id, _ = _load_keyring()
+    body = bytearray(_HEADER.pack(VERSION, key_id, int(time.time()) + expires_in))
+    for value in fields:
+        if value < 0:
+            raise ValueError('Token fields must be non-negative integers.')
+        _encode_varint(value, body)
+    body += _mac(key_id, purpose, body)
+    return base64.urlsafe_b64encode(body).rstrip(b'=').decode()
+
+
+def unsign(purpose, token):
+    """Return the fields signed into ``token`` or raise BadSignature/SignatureExpired."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (binascii.Error, ValueError, TypeError):
+        raise BadSignature('Malformed token')
+    if len(raw) < _HEADER.size + MAC_SIZE:
+        raise BadSignature('Malformed token')
+    body, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+    version, key_id, expires = _HEADER.unpack_from(body)
+    if version != VERSION or key_id not in _load_keyring()[1]:
+        raise BadSignature('Unknown token version or key')
+    if not hmac.compare_digest(mac, _mac(key_id, purpose, body)):
+        raise BadSignature('Token signature does not match')
+    if expires < time.time():
+        raise SignatureExpired('Token expired')
+    return _decode_varints(body[_HEADER.size:])
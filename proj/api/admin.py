@@ -1,3 +1,82 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from django.db import transaction
+from django.db.models import Q
+import uuid
+
+from fileshare_common.admin import LargeTableAdmin, in_batches
+
+from .lifecycle import delete_blob
+from .models import FileChange, FileUpload, User, lost_access_changes
 
 # Register your models here.
+@admin.register(FileUpload)
+class FileUploadAdmin(LargeTableAdmin):
+    list_display = ('assignment_id', 'file', 'uploader', 'uploaded_at', 'last_accessed_at', 'tier')
+    list_filter = ('tier',)
+    list_select_related = ('uploader',)
+    raw_id_fields = ('uploader',)
+    date_hierarchy = 'uploaded_at'
+    search_fields = ('assignment_id', 'file')
+    search_help_text = 'Prefix of the assignment id or file name.'
+    actions = ('delete_with_blobs', 'reissue_links')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Case-sensitive prefix matches can use the varchar_pattern_ops indexes.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        upload_to = FileUpload._meta.get_field('file').upload_to
+        return queryset.filter(
+            Q(assignment_id__startswith=term.lower()) | Q(file__startswith=upload_to + term)
+        ), False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The stock action leaves the files behind on disk.
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Delete selected files and their stored blobs', permissions=['delete'])
+    def delete_with_blobs(self, request, queryset):
+        deleted = 0
+        for batch in in_batches(queryset):
+            uploads = list(FileUpload.objects.filter(pk__in=batch).only('pk', 'file', 'assignment_id', 'tier'))
+            with transaction.atomic():
+                FileUpload.objects.filter(pk__in=batch).delete()
+            for upload in uploads:
+                delete_blob(upload)
+            deleted += len(uploads)
+        self.message_user(request, f'Deleted {deleted} files.', messages.SUCCESS)
+
+    @admin.action(description='Reissue assignment ids (revokes outstanding download links)', permissions=['change'])
+    def reissue_links(self, request, queryset):
+        reissued = 0
+        for batch in in_batches(queryset):
+            old_ids = dict(FileUpload.objects.filter(pk__in=batch).values_list('pk', 'assignment_id'))
+            uploads = [FileUpload(pk=pk, assignment_id=uuid.uuid4().hex) for pk in old_ids]
+            with transaction.atomic():
+                # Tell change-feed followers the old ids are gone and the new ones exist.
+                changes = lost_access_changes(old_ids)
+                changes += [FileChange(file_id=u.pk, assignment_id=u.assignment_id, action='add') for u in uploads]
+                FileUpload.objects.bulk_update(uploads, ['assignment_id'])
+                FileChange.objects.append(changes)
+            reissued += len(uploads)
+        self.message_user(request, f'Reissued {reissued} assignment ids.', messages.SUCCESS)
+
+
+@admin.register(User)
+class FileshareUserAdmin(LargeTableAdmin, UserAdmin):
+    list_display = ('username', 'email', 'role', 'email_verified', 'is_staff')
+    list_filter = ('role', 'email_verified', 'is_staff', 'is_active')
+    search_fields = ('username', 'email')
+    search_help_text = 'Prefix of the username or email (case-sensitive).'
+    fieldsets = UserAdmin.fieldsets + (('Fileshare', {'fields': ('role', 'email_verified')}),)
+
+    def get_search_results(self, request, queryset, search_term):
+        # '^username' would be istartswith, which no plain index serves. The unique
+        # username has a LIKE index already; email gets user_email_prefix.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(Q(username__startswith=term) | Q(email__startswith=term)), False
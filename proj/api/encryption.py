@@ -0,0 +1,256 @@
+"""
+Encryption at rest for uploaded files.
+
+Files are written as a fixed-size header followed by independently
+authenticated AES-256-GCM segments of ``SEGMENT_SIZE`` plaintext bytes::
+
+    magic (4) | master key id (1) | nonce prefix (7) | wrap nonce (12) | wrapped data key (48)
+    segment 0 | segment 1 | ... | final segment          (each: ciphertext + 16 byte tag)
+
+Every file gets its own random data key, wrapped with the active master key
+from ``FILE_ENCRYPTION_KEYS``. Segment nonces are the file's nonce prefix,
+the segment index and a final-segment flag, so segments cannot be reordered
+or the file truncated unnoticed. Because segments have a fixed size, a read
+at any offset decrypts only the segments it touches. Rotating the master key
+re-wraps the data keys without re-encrypting any segments
+(``rotate_file_keys``). Files written before encryption was enabled are read
+back as plaintext.
+
+Needs the optional ``cryptography`` package when keys are configured.
+"""
+import base64
+import io
+import os
+import shutil
+import struct
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+MAGIC = b'FSE1'
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+_PREFIX_SIZE = 7
+_WRAP_NONCE_SIZE = 12
+_WRAPPED_KEY_SIZE = 32 + TAG_SIZE
+HEADER_SIZE = len(MAGIC) + 1 + _PREFIX_SIZE + _WRAP_NONCE_SIZE + _WRAPPED_KEY_SIZE
+_CIPHER_SEGMENT_SIZE = SEGMENT_SIZE + TAG_SIZE
+
+
+def _aesgcm(key):
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    except ImportError:
+        raise ImproperlyConfigured('Encrypting files at rest requires the "cryptography" package.')
+    return AESGCM(key)
+
+
+def master_keys():
+    """Return (active key id, {key id: key bytes}); the mapping is empty when encryption is off."""
+    keys = {
+        int(key_id): base64.b64decode(key)
+        for key_id, key in getattr(settings, 'FILE_ENCRYPTION_KEYS', {}).items()
+    }
+    return getattr(settings, 'FILE_ENCRYPTION_ACTIVE_KEY_ID', None), keys
+
+
+def _nonce(prefix, index, final):
+    return prefix + struct.pack('>IB', index, final)
+
+
+class Header:
+    def __init__(self, key_id, prefix, wrap_nonce, wrapped_key):
+        self.key_id = key_id
+        self.prefix = prefix
+        self.wrap_nonce = wrap_nonce
+        self.wrapped_key = wrapped_key
+
+    @classmethod
+    def create(cls, data_key):
+        key_id, keys = master_keys()
+        if key_id not in keys:
+            raise ImproperlyConfigured('FILE_ENCRYPTION_ACTIVE_KEY_ID must name a key in FILE_ENCRYPTION_KEYS.')
+        header = cls(key_id, os.urandom(_PREFIX_SIZE), None, None)
+        header.wrap(data_key, keys[key_id])
+        return header
+
+    @classmethod
+    def parse(cls, raw):
+        if len(raw) < HEADER_SIZE or not raw.startswith(MAGIC):
+            return None
+        pos = len(MAGIC)
+        key_id = raw[pos]
+        prefix = raw[pos + 1:pos + 1 + _PREFIX_SIZE]
+        pos += 1 + _PREFIX_SIZE
+        return cls(key_id, prefix, raw[pos:pos + _WRAP_NONCE_SIZE], raw[pos + _WRAP_NONCE_SIZE:HEADER_SIZE])
+
+    def _aad(self):
+        return MAGIC + bytes([self.key_id]) + self.prefix
+
+    def wrap(self, data_key, master_key):
+        self.wrap_nonce = os.urandom(_WRAP_NONCE_SIZE)
+        self.wrapped_key = _aesgcm(master_key).encrypt(self.wrap_nonce, data_key, self._aad())
+
+    def unwrap(self):
+        _, keys = master_keys()
+        if self.key_id not in keys:
+            raise ImproperlyConfigured(f'No file encryption key with id {self.key_id}.')
+        return _aesgcm(keys[self.key_id]).decrypt(self.wrap_nonce, self.wrapped_key, self._aad())
+
+    def to_bytes(self):
+        return MAGIC + bytes([self.key_id]) + self.prefix + self.wrap_nonce + self.wrapped_key
+
+
+def plaintext_size(ciphertext_size):
+    body = ciphertext_size - HEADER_SIZE
+    segments = max(-(-body // _CIPHER_SEGMENT_SIZE), 1)
+    return body - segments * TAG_SIZE
+
+
+class EncryptingFile(File):
+    """Wraps an upload so that ``chunks()`` yields the encrypted file."""
+
+    def __init__(self, file):
+        super().__init__(file, getattr(file, 'name', None))
+        self.data_key = os.urandom(32)
+        self.header = Header.create(self.data_key)
+
+    def chunks(self, chunk_size=None):
+        aead = _aesgcm(self.data_key)
+        prefix = self.header.prefix
+        yield self.header.to_bytes()
+        index = 0
+        pending = bytearray()
+        for data in self.file.chunks():
+            pending += data
+            # Keep at least one byte back so the last segment is always flagged final.
+            while len(pending) > SEGMENT_SIZE:
+                yield aead.encrypt(_nonce(prefix, index, 0), bytes(pending[:SEGMENT_SIZE]), None)
+                del pending[:SEGMENT_SIZE]
+                index += 1
+        yield aead.encrypt(_nonce(prefix, index, 1), bytes(pending), None)
+
+
+class DecryptingReader(io.RawIOBase):
+    """Seekable plaintext view of an encrypted file that decrypts only the segments it reads."""
+
+    def __init__(self, raw, header):
+        self.raw = raw
+        self.header = header
+        self._aead = _aesgcm(header.unwrap())
+        raw.seek(0, io.SEEK_END)
+        self.size = plaintext_size(raw.tell())
+        self._last_index = max(self.size - 1, 0) // SEGMENT_SIZE
+        self._pos = 0
+        self._cached_index = None
+        self._cached = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('Negative seek position')
+        self._pos = offset
+        return offset
+
+    def _segment(self, index):
+        if index != self._cached_index:
+            self.raw.seek(HEADER_SIZE + index * _CIPHER_SEGMENT_SIZE)
+            ciphertext = self.raw.read(_CIPHER_SEGMENT_SIZE)
+            nonce = _nonce(self.header.prefix, index, int(index == self._last_index))
+            self._cached = self._aead.decrypt(nonce, ciphertext, None)
+            self._cached_index = index
+        return self._cached
+
+    def readinto(self, buffer):
+        if self._pos >= self.size:
+            return 0
+        index, start = divmod(self._pos, SEGMENT_SIZE)
+        data = self._segment(index)[start:start + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_encrypted(raw):
+    """Return a plaintext reader for ``raw``, decrypting if the file is encrypted."""
+    header = Header.parse(raw.read(HEADER_SIZE))
+    if header is None:
+        raw.seek(0)
+        return raw
+    return DecryptingReader(raw, header)
+
+
+@deconstructible
+class EncryptedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage that encrypts new files when ``FILE_ENCRYPTION_KEYS`` is set."""
+
+    def _save(self, name, content):
+        if master_keys()[1]:
+            content = EncryptingFile(content)
+        return super()._save(name, content)
+
+    def _open(self, name, mode='rb'):
+        if 'b' not in mode or any(flag in mode for flag in 'wa+'):
+            raise ValueError('Encrypted files can only be opened for binary reading.')
+        return File(open_encrypted(open(self.path(name), 'rb')), name)
+
+    def size(self, name):
+        with open(self.path(name), 'rb') as raw:
+            if Header.parse(raw.read(HEADER_SIZE)) is None:
+                return super().size(name)
+        return plaintext_size(super().size(name))
+
+
+def rewrap(path):
+    """
+    Re-wrap the data key of the file at ``path`` with the active master key;
+    return True if changed.
+
+    The new header and the unchanged segments are written to a temporary file
+    next to ``path`` that then replaces it, so a crash or a concurrent reader
+    never sees a half-written header.
+    """
+    key_id, keys = master_keys()
+    with open(path, 'rb') as raw:
+        header = Header.parse(raw.read(HEADER_SIZE))
+        if header is None or header.key_id == key_id:
+            return False
+        data_key = header.unwrap()
+        header.key_id = key_id
+        header.wrap(data_key, keys[key_id])
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.rewrap-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(header.to_bytes())
+                shutil.copyfileobj(raw, tmp)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return True
+
+
+upload_storage = EncryptedFileSystemStorage()
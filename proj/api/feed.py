@@ -0,0 +1,188 @@
+"""
+Change feed for client dashboards.
+
+Clients keep a cursor (the last ``FileChange.seq`` they saw) and either ask
+for everything after it (``ClientFileChangesView``) or hold an async
+connection open (``file_change_stream`` / ``file_change_poll``). The async
+views never tie up a worker thread while idle: a single poller task per
+process watches the newest sequence number and wakes every waiting
+subscriber at once.
+
+Browsers' EventSource cannot send an Authorization header, so the stream
+also accepts a short-lived ``?token=`` from ``ClientFileChangeStreamLinkView``.
+The token is checked when the stream opens; clients fetch a new link before
+reconnecting once it has expired.
+
+Clients only see ``add`` entries for files granted to them. ``delete``
+entries name the user or group that lost access (a revoked grant, or every
+grantee of a deleted file or reissued assignment id) and are only sent to
+that user or the group's members, and only while they cannot see the file
+under that assignment id some other way.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signing import BadSignature
+from django.db.models import Exists, Max, OuterRef, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from fileshare_common import tokens
+
+from .models import FileAccessGrant, FileChange, User, memberships
+from .serializers import FileChangeSerializer
+
+PAGE_SIZE = 100
+STREAM_TOKEN_MAX_AGE = 60
+
+
+def visible_changes(user):
+    # Visible under the entry's assignment id: a reissued file no longer is under its old one.
+    visible = Exists(FileAccessGrant.objects.for_user(user).filter(
+        file_id=OuterRef('file_id'), file__assignment_id=OuterRef('assignment_id'),
+    ))
+    addressed = Q(user_id=user.pk) | Q(group_id__in=memberships(user))
+    return (Q(visible) & Q(action='add')) | (~Q(visible) & Q(action='delete') & addressed)
+
+
+def changes_since(cursor, limit=PAGE_SIZE, user=None):
+    queryset = FileChange.objects.filter(seq__gt=cursor)
+    latest = None
+    if user is not None:
+        # Entries the user may not see still move their cursor past them.
+        latest = FileChange.objects.aggregate(latest=Max('seq'))['latest'] or cursor
+        queryset = queryset.filter(visible_changes(user), seq__lte=latest)
+    changes = list(queryset.order_by('seq')[:limit])
+    if len(changes) < limit and latest is not None:
+        cursor = max(cursor, latest)
+    elif changes:
+        cursor = changes[-1].seq
+    return FileChangeSerializer(changes, many=True).data, cursor
+
+
+def parse_cursor(value):
+    try:
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class ChangeBroadcaster:
+    """Wakes async subscribers when the newest ``FileChange.seq`` moves."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.latest = None
+        self.subscribers = 0
+        self._ready = None
+        self._changed = None
+        self._task = None
+
+    async def wait_for(self, cursor, timeout):
+        """Return True once a change newer than ``cursor`` exists, False on timeout."""
+        self.subscribers += 1
+        try:
+            if self._task is None or self._task.done():
+                self.latest = None
+                self._changed = asyncio.Event()
+                self._ready = asyncio.ensure_future(self._fetch_latest())
+                self._task = asyncio.create_task(self._poll())
+            initial = await self._ready
+            if self.latest is None:
+                self.latest = initial
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while self.latest <= cursor:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+            return True
+        finally:
+            self.subscribers -= 1
+
+    async def _poll(self):
+        initial = await self._ready
+        if self.latest is None:
+            self.latest = initial
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            latest = await self._fetch_latest()
+            if latest > self.latest:
+                self.latest = latest
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+
+    @sync_to_async
+    def _fetch_latest(self):
+        return FileChange.objects.aggregate(latest=Max('seq'))['latest'] or 0
+
+
+broadcaster = ChangeBroadcaster(getattr(settings, 'CHANGE_FEED_POLL_INTERVAL', 1.0))
+
+
+@sync_to_async
+def _authenticate_client(request, allow_token=False):
+    if allow_token and 'token' in request.GET:
+        try:
+            (user_pk,) = tokens.unsign('change-stream', request.GET['token'])
+        except (BadSignature, ValueError):
+            return None
+        return User.objects.filter(pk=user_pk, role='client', is_active=True).first()
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is None or result[0].role != 'client':
+        return None
+    return result[0]
+
+
+async def file_change_poll(request):
+    """Long-poll: answer as soon as there is a change after ``since``."""
+    user = await _authenticate_client(request)
+    if user is None:
+        return JsonResponse({'message': 'Only client users can follow file changes.'}, status=403)
+    cursor = parse_cursor(request.GET.get('since'))
+    if cursor is None:
+        return JsonResponse({'message': 'Invalid cursor.'}, status=400)
+    timeout = min(parse_cursor(request.GET.get('timeout')) or 25, 60)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    changes = []
+    # Keep waiting while the new entries are all for files this client cannot see.
+    while not changes and await broadcaster.wait_for(cursor, deadline - loop.time()):
+        changes, cursor = await sync_to_async(changes_since)(cursor, user=user)
+    return JsonResponse({'changes': changes, 'cursor': cursor})
+
+
+async def _event_stream(cursor, user):
+    keepalive = getattr(settings, 'CHANGE_FEED_KEEPALIVE', 15)
+    yield 'retry: 3000\n\n'
+    while True:
+        if not await broadcaster.wait_for(cursor, keepalive):
+            yield ': keepalive\n\n'
+            continue
+        changes, cursor = await sync_to_async(changes_since)(cursor, user=user)
+        for change in changes:
+            yield f"id: {change['seq']}\nevent: {change['action']}\ndata: {json.dumps(change)}\n\n"
+
+
+async def file_change_stream(request):
+    """Server-Sent Events stream of file changes after ``since`` / ``Last-Event-ID``."""
+    user = await _authenticate_client(request, allow_token=True)
+    if user is None:
+        return JsonResponse({'message': 'Only client users can follow file changes.'}, status=403)
+    cursor = parse_cursor(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    if cursor is None:
+        return JsonResponse({'message': 'Invalid cursor.'}, status=400)
+    response = StreamingHttpResponse(_event_stream(cursor, user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,281 @@
+"""
+Storage tiering and retention for uploaded files and document chunks.
+
+A download updates the file's ``last_accessed_at`` itself, with one UPDATE
+that only runs when the stored time is more than
+``ACCESS_RESOLUTION_MINUTES`` old, so a busy file costs one write an hour
+and every worker and the sweeper see the same value. The ``sweep_storage``
+command then works through the files in bounded batches:
+
+* files not downloaded for ``COLD_AFTER_DAYS`` are moved to
+  ``COLD_STORAGE_ROOT`` (a cheaper volume), keeping their name,
+* files not downloaded for ``RETAIN_DAYS`` are deleted, row and blob, and
+* chunks no document version uses any more are deleted once they have
+  been unused for ``ORPHAN_CHUNK_GRACE_HOURS``. Unused chunks are found a
+  page of ``BATCH_SIZE`` chunks at a time, counted against the same budget.
+
+A download of a cold file moves it back first. Moves copy the blob to the
+other tier, switch ``tier`` in the database and remove the old copy only
+once that commits, so a reader always finds the blob where the committed
+row says it is. Blobs are moved as they are, so encrypted files stay
+encrypted on the cold tier. Retention is off unless ``RETAIN_DAYS`` is set.
+"""
+import os
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from fileshare.db_router import PRIMARY_DB
+
+from .encryption import EncryptedFileSystemStorage, upload_storage
+from .models import Chunk, FileUpload, VersionChunk
+from .versioning import chunk_path
+
+DEFAULTS = {
+    'COLD_AFTER_DAYS': 90,
+    'RETAIN_DAYS': None,
+    'COLD_STORAGE_ROOT': None,
+    'BATCH_SIZE': 500,
+    'ACCESS_RESOLUTION_MINUTES': 60,
+    'ORPHAN_CHUNK_GRACE_HOURS': 24,
+}
+_ORPHAN_CURSOR_KEY = 'lifecycle:orphan-chunk-cursor'
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'FILE_LIFECYCLE', {})}
+
+
+def hot_storage():
+    return FileUpload._meta.get_field('file').storage
+
+
+def cold_storage():
+    root = config()['COLD_STORAGE_ROOT'] or os.path.join(settings.MEDIA_ROOT, 'cold')
+    return EncryptedFileSystemStorage(location=root)
+
+
+def storage_for(tier):
+    return cold_storage() if tier == FileUpload.TIER_COLD else hot_storage()
+
+
+def _copy(name, source, target):
+    """Copy a blob to ``target``; the name only appears once the copy is complete."""
+    destination = target.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    partial = f'{destination}.{uuid.uuid4().hex}.partial'
+    try:
+        try:
+            # Same volume: a second link to the same data, no copy needed.
+            os.link(source.path(name), partial)
+        except OSError:
+            shutil.copyfile(source.path(name), partial)
+        os.replace(partial, destination)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+
+
+def _discard_after_commit(storage, names):
+    """Delete the old copies once the tier switch commits, leave them if it rolls back."""
+    def discard():
+        for name in names:
+            storage.delete(name)
+    transaction.on_commit(discard)
+
+
+def touch(upload):
+    """Record a download of ``upload``, at most once per ``ACCESS_RESOLUTION_MINUTES``."""
+    now = timezone.now()
+    stale = now - timedelta(minutes=config()['ACCESS_RESOLUTION_MINUTES'])
+    if 'last_accessed_at' not in upload.get_deferred_fields() and upload.last_accessed_at >= stale:
+        return
+    # Bookkeeping rather than the client's own write, so it goes straight to the
+    # primary without pinning the client's next reads there.
+    FileUpload.objects.using(PRIMARY_DB).filter(pk=upload.pk, last_accessed_at__lt=stale).update(last_accessed_at=now)
+    upload.last_accessed_at = now
+
+
+def rehydrate(upload):
+    """Move a cold file back to the hot tier; no-op if another request already did."""
+    with transaction.atomic():
+        row = FileUpload.objects.select_for_update().filter(pk=upload.pk).values('tier').first()
+        if row and row['tier'] == FileUpload.TIER_COLD:
+            cold = cold_storage()
+            _copy(upload.file.name, cold, hot_storage())
+            FileUpload.objects.filter(pk=upload.pk).update(tier=FileUpload.TIER_HOT, last_accessed_at=timezone.now())
+            _discard_after_commit(cold, [upload.file.name])
+    upload.tier = FileUpload.TIER_HOT
+
+
+def open_for_download(upload):
+    """
+    Open ``upload`` for reading from the hot tier, rehydrating it first if needed.
+
+    Raises FileNotFoundError if the blob is gone, and FileUpload.DoesNotExist
+    if the row was deleted meanwhile.
+    """
+    for attempt in range(3):
+        if upload.tier == FileUpload.TIER_COLD:
+            rehydrate(upload)
+        try:
+            fileobj = upload.file.open('rb')
+        except FileNotFoundError:
+            # A sweep froze or purged it since the row was read; look again.
+            tier = upload.tier
+            upload.refresh_from_db(fields=['tier'])
+            if upload.tier == tier:
+                raise
+            continue
+        touch(upload)
+        return fileobj
+    raise FileNotFoundError(upload.file.name)
+
+
+def delete_blob(upload):
+    if upload.file:
+        storage_for(upload.tier).delete(upload.file.name)
+
+
+def _batches(queryset, size):
+    # Keyset pagination: rows that fail to move are not picked up again.
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).order_by('pk')[:size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def _lock(batch, cutoff):
+    """
+    Lock the rows of ``batch`` that still qualify: rows a download is
+    rehydrating or another sweeper holds are skipped, and rows downloaded
+    since the batch was read no longer pass ``cutoff``.
+    """
+    locked = FileUpload.objects.select_for_update(skip_locked=True).filter(pk__in=[upload.pk for upload in batch])
+    if cutoff is not None:
+        locked = locked.filter(last_accessed_at__lt=cutoff)
+    return locked
+
+
+def freeze(batch, cutoff=None):
+    """Move the blobs of ``batch`` to the cold tier; return how many moved."""
+    moved = []
+    hot, cold = hot_storage(), cold_storage()
+    with transaction.atomic():
+        locked = _lock(batch, cutoff).filter(tier=FileUpload.TIER_HOT).only('pk', 'file')
+        for upload in locked:
+            try:
+                _copy(upload.file.name, hot, cold)
+            except FileNotFoundError:
+                continue
+            moved.append(upload)
+        FileUpload.objects.filter(pk__in=[upload.pk for upload in moved]).update(tier=FileUpload.TIER_COLD)
+        _discard_after_commit(hot, [upload.file.name for upload in moved])
+    return len(moved)
+
+
+def purge(batch, cutoff=None):
+    """Delete the rows and blobs of ``batch``; return how many were deleted."""
+    with transaction.atomic():
+        # The tier is read under the lock, so the blob is deleted where it is now.
+        doomed = list(_lock(batch, cutoff).only('pk', 'file', 'tier', 'assignment_id'))
+        FileUpload.objects.filter(pk__in=[upload.pk for upload in doomed]).delete()
+        for tier, _ in FileUpload.TIER_CHOICES:
+            _discard_after_commit(storage_for(tier), [
+                upload.file.name for upload in doomed if upload.tier == tier and upload.file
+            ])
+    return len(doomed)
+
+
+def _mark_orphans(batch_size, now, budget=None):
+    """
+    Set ``orphaned_at`` on chunks no version uses and clear it on chunks used
+    again, one page of ``batch_size`` chunks per batch; return batches used.
+
+    A sweep whose budget runs out leaves a cursor in the cache, and the next
+    one resumes there.
+    """
+    referenced = Exists(VersionChunk.objects.filter(chunk=OuterRef('pk')))
+    start = cache.get(_ORPHAN_CURSOR_KEY, '')
+    batches = 0
+    while budget is None or batches < budget:
+        page = Chunk.objects.filter(pk__gt=start)
+        ends = list(page.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size])
+        if ends:
+            page = page.filter(pk__lte=ends[0])
+        page.filter(referenced, orphaned_at__isnull=False).update(orphaned_at=None)
+        page.filter(~referenced, orphaned_at__isnull=True).update(orphaned_at=now)
+        batches += 1
+        if not ends:
+            # A full pass is done; the next sweep starts over.
+            start = ''
+            break
+        start = ends[0]
+    cache.set(_ORPHAN_CURSOR_KEY, start, None)
+    return batches
+
+
+def collect_chunks(batch_size, now, budget=None):
+    """
+    Delete chunks no version has used for ``ORPHAN_CHUNK_GRACE_HOURS``, then
+    mark new orphans; return (chunks deleted, batches used).
+
+    ``store_version`` clears ``orphaned_at`` before it reuses a chunk, so a
+    chunk about to be reused again is never old enough to be picked here.
+    """
+    referenced = Exists(VersionChunk.objects.filter(chunk=OuterRef('pk')))
+    expired = Chunk.objects.filter(
+        ~referenced, orphaned_at__lt=now - timedelta(hours=config()['ORPHAN_CHUNK_GRACE_HOURS'])
+    )
+    deleted = batches = 0
+    while budget is None or batches < budget:
+        with transaction.atomic():
+            digests = list(
+                expired.select_for_update(skip_locked=True).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not digests:
+                break
+            Chunk.objects.filter(pk__in=digests).delete()
+            # Before the commit: once the rows are gone an upload may store the same chunk again.
+            for digest in digests:
+                upload_storage.delete(chunk_path(digest))
+        deleted += len(digests)
+        batches += 1
+    batches += _mark_orphans(batch_size, now, None if budget is None else budget - batches)
+    return deleted, batches
+
+
+def sweep(batch_size=None, max_batches=None, now=None):
+    """Run one pass of the retention, tiering and chunk rules; return counts of what each removed or moved."""
+    cfg = config()
+    batch_size = batch_size or cfg['BATCH_SIZE']
+    now = now or timezone.now()
+    result = {'purged': 0, 'frozen': 0, 'chunks': 0}
+    budget = max_batches
+    files = FileUpload.objects.only('pk', 'file', 'tier', 'assignment_id')
+    rules = []
+    if cfg['RETAIN_DAYS'] is not None:
+        cutoff = now - timedelta(days=cfg['RETAIN_DAYS'])
+        rules.append(('purged', files.filter(last_accessed_at__lt=cutoff), purge, cutoff))
+    if cfg['COLD_AFTER_DAYS'] is not None:
+        cutoff = now - timedelta(days=cfg['COLD_AFTER_DAYS'])
+        rules.append(('frozen', files.filter(tier=FileUpload.TIER_HOT, last_accessed_at__lt=cutoff), freeze, cutoff))
+    for key, queryset, action, cutoff in rules:
+        for batch in _batches(queryset, batch_size):
+            if budget is not None:
+                if budget <= 0:
+                    return result
+                budget -= 1
+            result[key] += action(batch, cutoff)
+    result['chunks'], _ = collect_chunks(batch_size, now, budget)
+    return result
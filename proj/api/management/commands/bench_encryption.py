@@ -0,0 +1,52 @@
+import base64
+import os
+import random
+import tempfile
+import time
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api.encryption import EncryptedFileSystemStorage
+
+
+class Command(BaseCommand):
+    help = 'Measure write, full-read and range-read throughput of encrypted uploads against plaintext.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=50)
+        parser.add_argument('--ranges', type=int, default=200, help='Random 64 KiB range reads.')
+
+    def handle(self, *args, size_mb, ranges, **options):
+        data = os.urandom(size_mb * 1024 * 1024)
+        keys = {1: base64.b64encode(os.urandom(32)).decode()}
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(FILE_ENCRYPTION_KEYS=keys, FILE_ENCRYPTION_ACTIVE_KEY_ID=1):
+            for label, storage in (
+                ('plaintext', FileSystemStorage(location=os.path.join(root, 'plain'))),
+                ('encrypted', EncryptedFileSystemStorage(location=os.path.join(root, 'enc'))),
+            ):
+                start = time.perf_counter()
+                name = storage.save('bench.bin', ContentFile(data))
+                write = time.perf_counter() - start
+
+                start = time.perf_counter()
+                with storage.open(name, 'rb') as fh:
+                    while fh.read(64 * 1024):
+                        pass
+                read = time.perf_counter() - start
+
+                offsets = [random.randrange(len(data) - 64 * 1024) for _ in range(ranges)]
+                start = time.perf_counter()
+                with storage.open(name, 'rb') as fh:
+                    for offset in offsets:
+                        fh.seek(offset)
+                        fh.read(64 * 1024)
+                ranged = time.perf_counter() - start
+
+                self.stdout.write(
+                    f'{label:<10} write {size_mb / write:8.1f} MB/s   read {size_mb / read:8.1f} MB/s   '
+                    f'range {ranged / ranges * 1e6:8.1f} us/read'
+                )
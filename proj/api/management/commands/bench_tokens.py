@@ -0,0 +1,29 @@
+import timeit
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from fileshare_common import tokens
+from api.views import DOWNLOAD_LINK_MAX_AGE, download_token, signer
+
+
+class Command(BaseCommand):
+    help = 'Compare sign/verify cost of compact download tokens against TimestampSigner links.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000)
+
+    def handle(self, *args, number, **options):
+        file_pk, assignment_id, user_pk = 67890, uuid.uuid4().hex, 12345
+        legacy = signer.sign(f'{assignment_id}:{user_pk}')
+        compact = download_token(file_pk, assignment_id, user_pk)
+        cases = [
+            ('TimestampSigner.sign', lambda: signer.sign(f'{assignment_id}:{user_pk}')),
+            ('TimestampSigner.unsign', lambda: signer.unsign(legacy, max_age=DOWNLOAD_LINK_MAX_AGE)),
+            ('tokens.sign', lambda: download_token(file_pk, assignment_id, user_pk)),
+            ('tokens.unsign', lambda: tokens.unsign('download', compact)),
+        ]
+        self.stdout.write(f'token length: legacy={len(legacy)} compact={len(compact)}')
+        for name, func in cases:
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            self.stdout.write(f'{name:<24} {seconds / number * 1e6:8.2f} us/op')
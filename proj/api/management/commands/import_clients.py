@@ -0,0 +1,7 @@
+from fileshare_common.onboarding import ImportClientsCommand
+
+from api.onboarding import FileshareClientImporter
+
+
+class Command(ImportClientsCommand):
+    importer_class = FileshareClientImporter
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.encryption import rewrap, upload_storage
+from api.lifecycle import storage_for
+from api.models import Chunk, FileUpload
+from api.versioning import chunk_path
+
+
+class Command(BaseCommand):
+    help = 'Re-wrap the data keys of encrypted uploads and document chunks with FILE_ENCRYPTION_ACTIVE_KEY_ID.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        rotated = 0
+        rows = FileUpload.objects.order_by('pk').values_list('file', 'tier')
+        storages = {tier: storage_for(tier) for tier, _ in FileUpload.TIER_CHOICES}
+        for name, tier in rows.iterator(chunk_size=batch_size):
+            storage = storages[tier]
+            if name and storage.exists(name) and rewrap(storage.path(name)):
+                rotated += 1
+        digests = Chunk.objects.order_by('pk').values_list('pk', flat=True)
+        for digest in digests.iterator(chunk_size=batch_size):
+            name = chunk_path(digest)
+            if upload_storage.exists(name) and rewrap(upload_storage.path(name)):
+                rotated += 1
+        self.stdout.write(self.style.SUCCESS(f'Re-wrapped {rotated} file keys.'))
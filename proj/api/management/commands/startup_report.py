@@ -0,0 +1,97 @@
+import os
+import re
+import subprocess
+import sys
+import timeit
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.utils.module_loading import import_string
+
+# Loaded at startup only if something imports them eagerly. simplejwt, the
+# admin site and django.core.mail are not listed: DRF's settings and schema
+# generator and Django's logging import them in every profile.
+HEAVY_MODULES = (
+    'django.contrib.sessions.middleware',
+    'django.contrib.messages.middleware',
+    'api.onboarding',
+    'concurrent.futures.process',
+    'numpy',
+)
+
+# Run in a fresh interpreter: what a new worker does before its first request.
+_STARTUP = '''
+import sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print('elapsed', time.perf_counter() - start)
+print('modules', len(sys.modules))
+print('heavy', *[name for name in sys.argv[1:] if name in sys.modules])
+'''
+
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+class Command(BaseCommand):
+    help = 'Report cold-start import time and per-request middleware cost for one or more settings modules.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', action='append', dest='profiles',
+            help='Settings module to measure; repeat to compare (default: fileshare.settings and fileshare.settings_api).',
+        )
+        parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list.')
+        parser.add_argument('--number', type=int, default=2000, help='Requests per middleware timing.')
+
+    def handle(self, *args, profiles, top, number, **options):
+        for profile in profiles or ['fileshare.settings', 'fileshare.settings_api']:
+            self.stdout.write(self.style.MIGRATE_HEADING(profile))
+            self.report_startup(profile, top)
+            self.report_middleware(profile, number)
+
+    def report_startup(self, profile, top):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _STARTUP, *HEAVY_MODULES],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': profile},
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            # The traceback's last line, not the import timings around it.
+            errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+            self.stderr.write(errors[-1] if errors else f'exited with {result.returncode}')
+            return
+        out = dict(line.partition(' ')[::2] for line in result.stdout.splitlines())
+        self.stdout.write(f"startup: {float(out['elapsed']) * 1000:.0f} ms, {out['modules']} modules")
+        self.stdout.write(f"eagerly loaded: {out['heavy'].strip() or '-'}")
+        # Top-level packages only; their cumulative time includes everything they pulled in.
+        packages = {}
+        for match in _IMPORT_LINE.finditer(result.stderr):
+            cumulative, indent, name = int(match[2]), len(match[3]), match[4]
+            if indent == 1:
+                package = name.split('.')[0]
+                packages[package] = packages.get(package, 0) + cumulative
+        for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'  {micros / 1000:8.1f} ms  {package}')
+
+    def report_middleware(self, profile, number):
+        middleware = import_string(profile + '.MIDDLEWARE')
+        factory = RequestFactory()
+
+        def per_request(names):
+            # GET / through the chain; the homepage view runs no queries.
+            with override_settings(MIDDLEWARE=names, ALLOWED_HOSTS=['*']):
+                handler = BaseHandler()
+                handler.load_middleware()
+                seconds = min(timeit.repeat(
+                    lambda: handler.get_response(factory.get('/')), number=number, repeat=3,
+                ))
+            return seconds / number * 1e6
+
+        baseline = per_request([])
+        cost = per_request(middleware)
+        self.stdout.write(f'middleware: {len(middleware)} classes, {cost - baseline:.1f} us/request over no middleware')
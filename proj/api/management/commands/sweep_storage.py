@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.lifecycle import config, sweep
+
+
+class Command(BaseCommand):
+    help = 'Purge files past FILE_LIFECYCLE RETAIN_DAYS, move idle ones to the cold tier and delete unused chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=config()['BATCH_SIZE'])
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches (default: no limit).')
+
+    def handle(self, *args, batch_size, max_batches, **options):
+        result = sweep(batch_size=batch_size, max_batches=max_batches)
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {result['purged']} files, moved {result['frozen']} to cold storage, "
+            f"deleted {result['chunks']} unused chunks."
+        ))
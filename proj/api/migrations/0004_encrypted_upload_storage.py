@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:52
+
+import api.encryption
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_document_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileupload',
+            name='file',
+            field=models.FileField(storage=api.encryption.EncryptedFileSystemStorage(), upload_to='uploads/'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_last_accessed(apps, schema_editor):
+    # Count existing files as last used when they were uploaded.
+    FileUpload = apps.get_model('api', 'FileUpload')
+    FileUpload.objects.update(last_accessed_at=models.F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_file_access_grants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='last_accessed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_accessed, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='fileupload',
+            name='tier',
+            field=models.CharField(choices=[('hot', 'Hot'), ('cold', 'Cold')], default='hot', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['tier', 'last_accessed_at'], name='fileupload_tier_access'),
+        ),
+    ]
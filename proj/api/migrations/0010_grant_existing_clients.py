@@ -0,0 +1,38 @@
+from django.db import migrations
+
+LEGACY_GROUP = 'Existing clients'
+
+
+def grant_existing_clients(apps, schema_editor):
+    # Before grants every client saw every file. Keep it that way for the clients and
+    # files that existed then, through one group ops can shrink or delete later.
+    Group = apps.get_model('auth', 'Group')
+    User = apps.get_model('api', 'User')
+    FileUpload = apps.get_model('api', 'FileUpload')
+    FileAccessGrant = apps.get_model('api', 'FileAccessGrant')
+    Document = apps.get_model('api', 'Document')
+    DocumentAccessGrant = apps.get_model('api', 'DocumentAccessGrant')
+    files = list(FileUpload.objects.filter(grants__isnull=True).values_list('pk', flat=True))
+    documents = list(Document.objects.filter(grants__isnull=True).values_list('pk', flat=True))
+    if not files and not documents:
+        return
+    group, _ = Group.objects.get_or_create(name=LEGACY_GROUP)
+    Membership = User.groups.through
+    clients = User.objects.filter(role='client').values_list('pk', flat=True)
+    Membership.objects.bulk_create(
+        [Membership(user_id=pk, group_id=group.pk) for pk in clients], batch_size=1000, ignore_conflicts=True,
+    )
+    FileAccessGrant.objects.bulk_create([FileAccessGrant(file_id=pk, group_id=group.pk) for pk in files], batch_size=1000)
+    DocumentAccessGrant.objects.bulk_create(
+        [DocumentAccessGrant(document_id=pk, group_id=group.pk) for pk in documents], batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_document_grants'),
+    ]
+
+    operations = [
+        migrations.RunPython(grant_existing_clients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_grant_existing_clients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='orphaned_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
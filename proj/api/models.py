@@ -1,5 +1,10 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from contextvars import ContextVar
+
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+from django.db.models import Exists, OuterRef, Q
+from django.contrib.auth.models import AbstractUser, Group
+from .encryption import upload_storage
 
 # Create your models here.
 
@@ -11,15 +16,229 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     email_verified = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Prefix searches from the admin; username's unique index already has a LIKE twin.
+            models.Index(fields=['email'], name='user_email_prefix', opclasses=['varchar_pattern_ops']),
+        ]
+
+# Set while FileUploadQuerySet.delete logs lost access itself; see api.signals.
+batch_delete = ContextVar('fileshare_batch_delete', default=False)
+
+class FileUploadQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Files granted to ``user`` directly or through one of their groups, as one EXISTS subquery."""
+        return self.filter(Exists(FileAccessGrant.objects.for_user(user).filter(file=OuterRef('pk'))))
+
+    def delete(self):
+        """
+        Delete the files and log who lost access with one ``FileChange.append``
+        for all of them, instead of one query and one table lock per row from
+        the signal handlers.
+        """
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            files = dict(self.using(using).values_list('pk', 'assignment_id'))
+            changes = lost_access_changes(files, using=using)
+            token = batch_delete.set(True)
+            try:
+                deleted = super(FileUploadQuerySet, self.using(using).filter(pk__in=files)).delete()
+            finally:
+                batch_delete.reset(token)
+            if changes:
+                FileChange.objects.append(changes)
+        return deleted
+
 class FileUpload(models.Model):
+    TIER_HOT = 'hot'
+    TIER_COLD = 'cold'
+    TIER_CHOICES = (
+        (TIER_HOT, 'Hot'),
+        (TIER_COLD, 'Cold'),
+    )
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
-    file = models.FileField(upload_to='uploads/')
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    file = models.FileField(upload_to='uploads/', storage=upload_storage)
+    uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)
     assignment_id = models.CharField(max_length=64, unique=True)
+    # Updated by api.lifecycle at most once per ACCESS_RESOLUTION_MINUTES.
+    last_accessed_at = models.DateTimeField(default=timezone.now)
+    tier = models.CharField(max_length=10, choices=TIER_CHOICES, default=TIER_HOT)
     allowed_types = ['pptx', 'docx', 'xlsx']
 
+    objects = FileUploadQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Prefix (LIKE 'abc%') searches from the admin; opclasses only apply on PostgreSQL.
+            models.Index(fields=['assignment_id'], name='fileupload_assignment_prefix', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['file'], name='fileupload_file_prefix', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['tier', 'last_accessed_at'], name='fileupload_tier_access'),
+        ]
+
     def save(self, *args, **kwargs):
         ext = self.file.name.split('.')[-1].lower()
         if ext not in self.allowed_types:
             raise ValueError('Only pptx, docx, and xlsx files are allowed.')
-        super().save(*args, **kwargs)
+        # The change feed entry (api.signals) commits or rolls back with the row.
+        using = kwargs.get('using') or router.db_for_write(FileUpload, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+def memberships(user):
+    return User.groups.through.objects.filter(user_id=user.pk).values('group_id')
+
+class AccessGrantQuerySet(models.QuerySet):
+    def for_user(self, user):
+        return self.filter(Q(user=user) | Q(group__in=memberships(user)))
+
+class FileAccessGrant(models.Model):
+    """Lets one client, or every member of a group, see and download a file."""
+    file = models.ForeignKey(FileUpload, on_delete=models.CASCADE, related_name='grants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='file_grants')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='file_grants')
+    granted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    granted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = AccessGrantQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(user__isnull=False, group__isnull=True) | Q(user__isnull=True, group__isnull=False),
+                name='fileaccessgrant_one_grantee',
+            ),
+            # Grantee first: these double as the indexes behind the visibility check.
+            models.UniqueConstraint(fields=['user', 'file'], condition=Q(user__isnull=False), name='fileaccessgrant_user_file'),
+            models.UniqueConstraint(fields=['group', 'file'], condition=Q(group__isnull=False), name='fileaccessgrant_group_file'),
+        ]
+
+class FileChangeQuerySet(models.QuerySet):
+    def append(self, changes):
+        """
+        Insert ``changes`` so that ``seq`` order is commit order.
+
+        Sequence values are handed out at insert time, so a transaction that
+        commits after a later one would otherwise land behind a cursor that
+        already moved past it. On PostgreSQL writers take an EXCLUSIVE lock on
+        the table until they commit (reads are not blocked); SQLite already
+        runs one write transaction at a time. Append last in a transaction,
+        since the lock is held until it ends.
+        """
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using, savepoint=False):
+            connection = connections[using]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {connection.ops.quote_name(self.model._meta.db_table)} IN EXCLUSIVE MODE')
+            return self.using(using).bulk_create(changes)
+
+class FileChange(models.Model):
+    """Append-only log of uploads and deletions, read by the change feed."""
+    ACTION_CHOICES = (
+        ('add', 'Added'),
+        ('delete', 'Deleted'),
+    )
+    seq = models.BigAutoField(primary_key=True)
+    file_id = models.BigIntegerField()
+    assignment_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Deletes name the user or group that lost access, so only they are told.
+    user_id = models.BigIntegerField(null=True, blank=True)
+    group_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = FileChangeQuerySet.as_manager()
+
+def lost_access_changes(files, grants=None, using=None):
+    """
+    Unsaved ``delete`` entries for the grantees of ``files`` ({pk: assignment id}),
+    or for those of ``grants`` only.
+    """
+    if grants is None:
+        grants = FileAccessGrant.objects.filter(file_id__in=files)
+    # Read from the primary: the caller is about to change these grants there.
+    using = using or router.db_for_write(FileAccessGrant)
+    return [
+        FileChange(file_id=file_id, assignment_id=files[file_id], action='delete', user_id=user_id, group_id=group_id)
+        for file_id, user_id, group_id in grants.using(using).values_list('file_id', 'user_id', 'group_id')
+    ]
+
+class DocumentQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Documents granted to ``user`` directly or through one of their groups."""
+        return self.filter(Exists(DocumentAccessGrant.objects.for_user(user).filter(document=OuterRef('pk'))))
+
+class Document(models.Model):
+    """A logical document whose uploads are kept as numbered versions."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
+    title = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = DocumentQuerySet.as_manager()
+
+class DocumentAccessGrant(models.Model):
+    """Lets one client, or every member of a group, see and download every version of a document."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='grants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='document_grants')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='document_grants')
+    granted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    granted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = AccessGrantQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(user__isnull=False, group__isnull=True) | Q(user__isnull=True, group__isnull=False),
+                name='documentaccessgrant_one_grantee',
+            ),
+            models.UniqueConstraint(fields=['user', 'document'], condition=Q(user__isnull=False), name='documentaccessgrant_user_document'),
+            models.UniqueConstraint(fields=['group', 'document'], condition=Q(group__isnull=False), name='documentaccessgrant_group_document'),
+        ]
+
+class ChunkQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Chunks of at least one version of a document granted to ``user``."""
+        granted = DocumentAccessGrant.objects.for_user(user).filter(document=OuterRef('version__document'))
+        return self.filter(Exists(VersionChunk.objects.filter(Exists(granted), chunk=OuterRef('pk'))))
+
+class Chunk(models.Model):
+    """A content-addressed piece of one or more document versions."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveIntegerField()
+    # Set by api.lifecycle while no version uses the chunk.
+    orphaned_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = ChunkQuerySet.as_manager()
+
+class DocumentVersionQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        return self.filter(Exists(DocumentAccessGrant.objects.for_user(user).filter(document=OuterRef('document'))))
+
+class DocumentVersion(models.Model):
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
+    number = models.PositiveIntegerField()
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_versions')
+    original_filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    stored_size = models.BigIntegerField(help_text='Bytes of new chunks this version added to storage.')
+    sha256 = models.CharField(max_length=64)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    objects = DocumentVersionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'number'], name='unique_document_version_number'),
+        ]
+
+class VersionChunk(models.Model):
+    version = models.ForeignKey(DocumentVersion, on_delete=models.CASCADE, related_name='chunk_entries')
+    position = models.PositiveIntegerField()
+    chunk = models.ForeignKey(Chunk, on_delete=models.PROTECT)
+    offset = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'position'], name='unique_version_chunk_position'),
+        ]
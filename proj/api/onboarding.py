@@ -0,0 +1,31 @@
+"""
+Bulk client onboarding for fileshare.
+
+The importer itself is shared with ez_project (``fileshare_common.onboarding``);
+this module supplies fileshare's client rows and verification links.
+"""
+from django.urls import reverse
+
+from fileshare_common import tokens
+from fileshare_common.onboarding import CHUNK_SIZE, ClientImporter, open_upload, read_records  # noqa: F401
+
+from .models import User
+
+
+class FileshareClientImporter(ClientImporter):
+    user_model = User
+
+    def build_user(self, username, email):
+        return User(username=username, email=email, role='client')
+
+    def verify_url(self, user):
+        from .views import VERIFY_LINK_MAX_AGE
+
+        token = tokens.sign('verify-email', user.pk, expires_in=VERIFY_LINK_MAX_AGE)
+        return f"{self.base_url}{reverse('client-verify-email')}?token={token}"
+
+
+def import_clients(records, chunk_size=CHUNK_SIZE, workers=None, send_email=True, base_url=None):
+    """Create client users from ``records``; return created/skipped counts and per-row errors."""
+    importer = FileshareClientImporter(chunk_size=chunk_size, workers=workers, send_email=send_email, base_url=base_url)
+    return importer.run(records)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import FileUpload
+from .models import FileUpload, FileChange, Document, DocumentVersion
 from django.contrib.auth.password_validation import validate_password
 
 User = get_user_model()
@@ -48,4 +48,57 @@ class FileUploadSerializer(serializers.ModelSerializer):
 class FileListSerializer(serializers.ModelSerializer):
     class Meta:
         model = FileUpload
-        fields = ('assignment_id', 'file', 'uploaded_at') 
\ No newline at end of file
+        fields = ('assignment_id', 'file', 'uploaded_at')
+
+class FileChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FileChange
+        fields = ('seq', 'action', 'assignment_id', 'created_at')
+
+class BatchDownloadLinkSerializer(serializers.Serializer):
+    assignment_ids = serializers.ListField(
+        child=serializers.CharField(max_length=64), allow_empty=False, max_length=500
+    )
+
+class FileGrantSerializer(serializers.Serializer):
+    assignment_ids = serializers.ListField(
+        child=serializers.CharField(max_length=64), required=False, default=list, max_length=500
+    )
+    document_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, default=list, max_length=500
+    )
+    usernames = serializers.ListField(
+        child=serializers.CharField(max_length=150), required=False, default=list, max_length=500
+    )
+    groups = serializers.ListField(
+        child=serializers.CharField(max_length=150), required=False, default=list, max_length=100
+    )
+
+    def validate(self, data):
+        if not data['assignment_ids'] and not data['document_ids']:
+            raise serializers.ValidationError('Give at least one assignment id or document id.')
+        if not data['usernames'] and not data['groups']:
+            raise serializers.ValidationError('Give at least one username or group.')
+        return data
+
+class DocumentVersionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentVersion
+        fields = ('number', 'original_filename', 'size', 'stored_size', 'sha256', 'uploaded_at')
+
+class DocumentSerializer(serializers.ModelSerializer):
+    latest_version = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Document
+        fields = ('id', 'title', 'created_at', 'latest_version')
+
+class DocumentUploadSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255, required=False)
+    file = serializers.FileField()
+
+    def validate_file(self, value):
+        ext = value.name.split('.')[-1].lower()
+        if ext not in FileUpload.allowed_types:
+            raise serializers.ValidationError('Only pptx, docx, and xlsx files are allowed.')
+        return value
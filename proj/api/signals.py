@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import FileChange, FileUpload, batch_delete, lost_access_changes
+
+
+@receiver(post_save, sender=FileUpload)
+def record_file_added(sender, instance, created, **kwargs):
+    if created:
+        FileChange.objects.append([
+            FileChange(file_id=instance.pk, assignment_id=instance.assignment_id, action='add')
+        ])
+
+
+@receiver(pre_delete, sender=FileUpload)
+def collect_lost_access(sender, instance, using, **kwargs):
+    if batch_delete.get():
+        # FileUploadQuerySet.delete logs the whole batch at once.
+        return
+    # The grants are deleted along with the file, so note who could see it first.
+    instance._lost_access = lost_access_changes({instance.pk: instance.assignment_id}, using=using)
+
+
+@receiver(post_delete, sender=FileUpload)
+def record_file_deleted(sender, instance, **kwargs):
+    changes = getattr(instance, '_lost_access', None)
+    if changes:
+        FileChange.objects.append(changes)
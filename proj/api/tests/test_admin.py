@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import FileAccessGrant, FileChange, FileUpload, User
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class UserAdminSearchTests(TestCase):
+    def setUp(self):
+        root = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        User.objects.create_user('alice', 'alice@example.com', 'pw', role='client')
+        User.objects.create_user('bob', 'bob@alice.example.com', 'pw', role='client')
+        self.client.force_login(root)
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:api_user_changelist'), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return sorted(user.username for user in response.context['cl'].result_list)
+
+    def test_prefix_of_username_or_email(self):
+        self.assertEqual(self.search('ali'), ['alice'])
+        self.assertEqual(self.search('bob@'), ['bob'])
+        self.assertEqual(self.search(''), ['alice', 'bob', 'root'])
+
+
+
+@override_settings(DATABASE_REPLICAS=[], FILE_ENCRYPTION_KEYS={})
+class FileAdminDeleteTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        root = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.client_user = User.objects.create_user('client', 'client@example.com', 'pw', role='client')
+        self.client.force_login(root)
+
+    def create_files(self, count):
+        uploads = [
+            FileUpload.objects.create(
+                uploader=self.ops, file=ContentFile(b'report', name='report.docx'), assignment_id=f'report{i}'
+            )
+            for i in range(count)
+        ]
+        FileAccessGrant.objects.bulk_create(FileAccessGrant(file=upload, user=self.client_user) for upload in uploads)
+        return uploads
+
+    def delete_with_blobs(self, uploads):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('admin:api_fileupload_changelist'), {
+                'action': 'delete_with_blobs', '_selected_action': [upload.pk for upload in uploads],
+            })
+        self.assertEqual(response.status_code, 302)
+        return len(captured)
+
+    def test_delete_logs_lost_access_once_per_batch(self):
+        counts = []
+        for count in (2, 20):
+            uploads = self.create_files(count)
+            seq = FileChange.objects.order_by('-seq').values_list('seq', flat=True).first()
+            counts.append(self.delete_with_blobs(uploads))
+            self.assertFalse(FileUpload.objects.exists())
+            self.assertFalse(any(upload.file.storage.exists(upload.file.name) for upload in uploads))
+            deletes = FileChange.objects.filter(seq__gt=seq, action='delete')
+            self.assertEqual(
+                sorted(deletes.values_list('assignment_id', 'user_id')),
+                sorted((upload.assignment_id, self.client_user.pk) for upload in uploads),
+            )
+        self.assertEqual(counts[0], counts[1])
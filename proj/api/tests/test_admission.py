@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import Throttled
+
+from fileshare_common.admission import (
+    DEFAULTS, LengthRequired, PayloadTooLarge, ServiceUnavailable, UploadAdmission, admission,
+)
+
+from ..models import FileUpload, User
+from .utils import auth_header
+
+
+class UploadAdmissionTests(SimpleTestCase):
+    """Runs with the project's UPLOAD_ADMISSION and MEDIA_ROOT, not test overrides."""
+
+    def setUp(self):
+        self.admission = UploadAdmission()
+        self.config = self.admission.config()
+        if self.admission._free_bytes() < self.config['MIN_FREE_BYTES'] + 1024 * 1024:
+            self.skipTest('not enough free disk space to admit uploads')
+
+    def test_project_settings_admit_an_upload(self):
+        self.assertEqual(self.config, {**DEFAULTS, **settings.UPLOAD_ADMISSION})
+        ticket = self.admission.acquire(1, 1024)
+        self.assertEqual((self.admission.active, self.admission.in_flight), (1, 1024))
+        self.admission.release(ticket)
+        self.assertEqual((self.admission.active, self.admission.in_flight, self.admission.per_user), (0, 0, {}))
+
+    def test_media_root_not_created_yet(self):
+        parent = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parent, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=os.path.join(parent, 'media', 'not-yet')):
+            with mock.patch('fileshare_common.admission.shutil.disk_usage', wraps=shutil.disk_usage) as disk_usage:
+                self.admission.release(self.admission.acquire(1, 1024))
+        # Measured on the closest directory that exists.
+        self.assertIn(mock.call(parent), disk_usage.call_args_list)
+
+    def test_per_user_limits(self):
+        tickets = [self.admission.acquire(1, 1024) for _ in range(self.config['PER_USER_CONCURRENT'])]
+        with self.assertRaises(Throttled):
+            self.admission.acquire(1, 1024)
+        # Other users still get in.
+        tickets.append(self.admission.acquire(2, 1024))
+        for ticket in tickets:
+            self.admission.release(ticket)
+        self.admission.release(self.admission.acquire(1, 1024))
+
+    def test_refused_uploads(self):
+        with self.assertRaises(LengthRequired):
+            self.admission.acquire(1, None)
+        with self.assertRaises(PayloadTooLarge):
+            self.admission.acquire(1, self.config['PER_USER_BYTES'] + 1)
+        with mock.patch.object(UploadAdmission, '_free_bytes', return_value=self.config['MIN_FREE_BYTES']):
+            with self.assertRaises(ServiceUnavailable):
+                self.admission.acquire(1, 1024)
+        self.assertEqual(self.admission.active, 0)
+
+
+@override_settings(
+    DATABASE_REPLICAS=[], FILE_ENCRYPTION_KEYS={},
+    UPLOAD_ADMISSION={'MIN_FREE_BYTES': 0, 'PER_USER_CONCURRENT': 1, 'PER_USER_BYTES': 1024 * 1024},
+)
+class UploadAdmissionResponseTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+
+    def upload(self, size=64):
+        upload = SimpleUploadedFile('report.docx', bytes(size))
+        return self.client.post(reverse('ops-upload'), {'file': upload}, headers=auth_header(self.ops))
+
+    def test_upload_in_progress_throttles_the_same_user(self):
+        ticket = admission.acquire(self.ops.pk, 1024)
+        try:
+            response = self.upload()
+        finally:
+            admission.release(ticket)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(DEFAULTS['RETRY_AFTER']))
+        self.assertEqual(self.upload().status_code, 201)
+
+    def test_refused_uploads(self):
+        self.assertEqual(self.upload(size=1024 * 1024).status_code, 413)
+        with override_settings(UPLOAD_ADMISSION={'MIN_FREE_BYTES': 2 ** 62}):
+            response = self.upload()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(DEFAULTS['RETRY_AFTER'] * 12))
+        self.assertFalse(FileUpload.objects.exists())
+        self.assertEqual((admission.active, admission.in_flight), (0, 0))
@@ -0,0 +1,121 @@
+"""
+Replica routing: run with a mirrored replica alias, e.g.
+``python manage.py test api --settings=fileshare.settings_test``.
+"""
+from contextlib import ExitStack
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from fileshare.db_router import ReplicaPinningMiddleware
+
+from ..models import FileAccessGrant, FileUpload, User
+from .utils import auth_header
+
+REPLICAS = settings.DATABASE_REPLICAS
+
+
+def _read_view(request):
+    return HttpResponse(str(User.objects.count()))
+
+
+def _write_view(request):
+    User.objects.filter(username='client').update(first_name='Written')
+    return HttpResponse('ok')
+
+
+class Queries:
+    """Queries run on the primary and on all replicas while the block runs."""
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        self._primary = self._stack.enter_context(CaptureQueriesContext(connections['default']))
+        self._replicas = [self._stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in REPLICAS]
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def primary(self):
+        return self._primary.captured_queries
+
+    @property
+    def replica(self):
+        return [query for captured in self._replicas for query in captured.captured_queries]
+
+
+@skipUnless(REPLICAS, 'needs a replica alias mirroring default, e.g. --settings=fileshare.settings_test')
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', *REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.client_user = User.objects.create_user(
+            'client', 'client@example.com', 'pw', role='client', email_verified=True
+        )
+        self.auth = auth_header(self.client_user)
+
+    def request(self, view, method='get', **kwargs):
+        request = getattr(self.factory, method)('/', **kwargs)
+        with Queries() as queries:
+            response = ReplicaPinningMiddleware(view)(request)
+        return response, queries
+
+    def test_get_reads_from_replica(self):
+        ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        upload = FileUpload.objects.create(uploader=ops, file='uploads/a.docx', assignment_id='a' * 32)
+        FileAccessGrant.objects.create(file=upload, user=self.client_user)
+        with Queries() as queries:
+            response = self.client.get(reverse('client-list-files'), headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['assignment_id'] for row in response.json()], [upload.assignment_id])
+        self.assertEqual(queries.primary, [])
+        self.assertTrue(queries.replica)
+
+    def test_unsafe_methods_use_primary(self):
+        response, queries = self.request(_read_view, 'post')
+        self.assertEqual(response.content, b'1')
+        self.assertEqual(len(queries.primary), 1)
+        self.assertEqual(queries.replica, [])
+
+    def test_writes_pin_the_rest_of_the_request(self):
+        def view(request):
+            _write_view(request)
+            return _read_view(request)
+
+        response, queries = self.request(view)
+        self.assertEqual(len(queries.primary), 2)
+        self.assertEqual(queries.replica, [])
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        self.factory.cookies[settings.REPLICA_PIN_COOKIE] = '1'
+        response, queries = self.request(_read_view)
+        self.assertEqual(len(queries.primary), 1)
+        self.assertEqual(queries.replica, [])
+
+    def test_write_pins_the_same_credentials_without_cookie(self):
+        self.request(_write_view, 'post', headers=self.auth)
+        _, pinned = self.request(_read_view, headers=self.auth)
+        self.assertEqual(len(pinned.primary), 1)
+        self.assertEqual(pinned.replica, [])
+
+        other = {'Authorization': 'Bearer someone-else'}
+        _, unpinned = self.request(_read_view, headers=other)
+        self.assertEqual(unpinned.primary, [])
+        self.assertEqual(len(unpinned.replica), 1)
+
+    def test_reads_alone_do_not_pin(self):
+        self.request(_read_view, headers=self.auth)
+        response, queries = self.request(_read_view, headers=self.auth)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(queries.primary, [])
+        self.assertEqual(len(queries.replica), 1)
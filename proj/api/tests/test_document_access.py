@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Document, DocumentAccessGrant, User
+from ..versioning import store_version
+from .utils import auth_header
+
+
+@override_settings(DATABASE_REPLICAS=[], FILE_ENCRYPTION_KEYS={})
+class DocumentAccessTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.granted = User.objects.create_user('granted', 'granted@example.com', 'pw', role='client', email_verified=True)
+        self.stranger = User.objects.create_user('stranger', 'stranger@example.com', 'pw', role='client', email_verified=True)
+        self.document = self.create_document('Report', b'shared chunk')
+        self.other = self.create_document('Other', b'other chunk')
+        DocumentAccessGrant.objects.create(document=self.document, user=self.granted)
+        self.digest = self.document.versions.get().chunk_entries.get().chunk_id
+        self.other_digest = self.other.versions.get().chunk_entries.get().chunk_id
+
+    def create_document(self, title, data):
+        document = Document.objects.create(owner=self.ops, title=title)
+        store_version(document, SimpleUploadedFile(f'{title}.docx', data), self.ops)
+        return document
+
+    def get(self, user, name, *args):
+        return self.client.get(reverse(name, args=args), headers=auth_header(user))
+
+    def test_client_without_grants_sees_nothing(self):
+        self.assertEqual(self.get(self.stranger, 'client-list-documents').json(), [])
+        self.assertEqual(self.get(self.stranger, 'client-document-versions', self.document.pk).json(), [])
+        for name in ('client-document-manifest', 'client-document-download'):
+            with self.subTest(name):
+                self.assertEqual(self.get(self.stranger, name, self.document.pk, 1).status_code, 404)
+        self.assertEqual(self.get(self.stranger, 'client-chunk', self.digest).status_code, 404)
+
+    def test_granted_client_sees_only_granted_documents(self):
+        listed = self.get(self.granted, 'client-list-documents').json()
+        self.assertEqual([document['id'] for document in listed], [self.document.pk])
+        self.assertEqual(len(self.get(self.granted, 'client-document-versions', self.document.pk).json()), 1)
+        self.assertEqual(self.get(self.granted, 'client-document-manifest', self.document.pk, 1).status_code, 200)
+        response = self.get(self.granted, 'client-document-download', self.document.pk, 1)
+        self.assertEqual(b''.join(response.streaming_content), b'shared chunk')
+        self.assertEqual(self.get(self.granted, 'client-chunk', self.digest).content, b'shared chunk')
+        self.assertEqual(self.get(self.granted, 'client-document-manifest', self.other.pk, 1).status_code, 404)
+        self.assertEqual(self.get(self.granted, 'client-chunk', self.other_digest).status_code, 404)
+
+    def test_ops_grant_and_revoke_documents(self):
+        def post(name):
+            return self.client.post(
+                reverse(name), {'document_ids': [self.other.pk, 999], 'usernames': ['stranger']},
+                content_type='application/json', headers=auth_header(self.ops),
+            )
+
+        response = post('ops-grant-files')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['missing']['document_ids'], [999])
+        self.assertEqual(self.get(self.stranger, 'client-chunk', self.other_digest).status_code, 200)
+        post('ops-revoke-files')
+        self.assertEqual(self.get(self.stranger, 'client-chunk', self.other_digest).status_code, 404)
@@ -0,0 +1,62 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import FileAccessGrant, FileUpload, User
+from .utils import auth_header
+
+
+@override_settings(DATABASE_REPLICAS=[], FILE_ENCRYPTION_KEYS={})
+class DownloadLinkTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.client_user = User.objects.create_user(
+            'client', 'client@example.com', 'pw', role='client', email_verified=True
+        )
+        self.auth = auth_header(self.client_user)
+        # Any assignment id works, not just 32 lowercase hex digits.
+        self.upload = FileUpload.objects.create(
+            uploader=ops, file=ContentFile(b'report', name='report.docx'), assignment_id='Q3-Report'
+        )
+        FileAccessGrant.objects.create(file=self.upload, user=self.client_user)
+
+    def link(self):
+        response = self.client.get(reverse('client-download-link', args=['Q3-Report']), headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['download-link']
+
+    def test_link_downloads_the_file(self):
+        response = self.client.get(self.link(), headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'report')
+
+    def test_batch_links_download_the_file(self):
+        response = self.client.post(
+            reverse('client-download-links'), {'assignment_ids': ['Q3-Report', 'missing']},
+            content_type='application/json', headers=self.auth,
+        )
+        self.assertEqual(response.json()['missing'], ['missing'])
+        link = response.json()['download-links']['Q3-Report']
+        self.assertEqual(self.client.get(link, headers=self.auth).status_code, 200)
+
+    def test_reissued_assignment_id_voids_link(self):
+        link = self.link()
+        FileUpload.objects.filter(pk=self.upload.pk).update(assignment_id='Q3-Report-v2')
+        self.assertEqual(self.client.get(link, headers=self.auth).status_code, 400)
+
+    def test_link_is_bound_to_its_client(self):
+        link = self.link()
+        other = User.objects.create_user('other', 'other@example.com', 'pw', role='client', email_verified=True)
+        FileAccessGrant.objects.create(file=self.upload, user=other)
+        other_auth = auth_header(other)
+        self.assertEqual(self.client.get(link, headers=other_auth).status_code, 403)
+
+    def test_malformed_token(self):
+        response = self.client.get(reverse('client-download-file', args=['not-a-token']), headers=self.auth)
+        self.assertEqual(response.status_code, 400)
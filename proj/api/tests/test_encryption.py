@@ -0,0 +1,113 @@
+import base64
+import importlib.util
+import os
+import random
+import shutil
+import tempfile
+from unittest import skipIf
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..encryption import (
+    HEADER_SIZE, MAGIC, SEGMENT_SIZE, TAG_SIZE, EncryptedFileSystemStorage, Header, rewrap, upload_storage,
+)
+from ..models import Document, User
+from ..versioning import chunk_path, iter_version, read_chunk, store_version
+
+KEY_1 = base64.b64encode(bytes(range(32))).decode()
+KEY_2 = base64.b64encode(bytes(range(32, 64))).decode()
+
+
+@skipIf(importlib.util.find_spec('cryptography') is None, 'cryptography is not installed')
+@override_settings(FILE_ENCRYPTION_KEYS={1: KEY_1}, FILE_ENCRYPTION_ACTIVE_KEY_ID=1)
+class EncryptionTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = EncryptedFileSystemStorage(location=self.location)
+        # Two full segments and part of a third.
+        self.data = random.Random(0).randbytes(2 * SEGMENT_SIZE + 1000)
+        self.name = self.storage.save('report.docx', ContentFile(self.data))
+        self.path = self.storage.path(self.name)
+
+    def read(self, start=0, length=None):
+        # Reads stop at segment boundaries, so keep reading like the download views do.
+        with self.storage.open(self.name) as f:
+            f.seek(start)
+            data = b''
+            while length is None or len(data) < length:
+                block = f.read(SEGMENT_SIZE if length is None else length - len(data))
+                if not block:
+                    break
+                data += block
+            return data
+
+    def test_round_trip(self):
+        with open(self.path, 'rb') as raw:
+            stored = raw.read()
+        self.assertTrue(stored.startswith(MAGIC))
+        self.assertNotIn(self.data[:64], stored)
+        self.assertEqual(len(stored), HEADER_SIZE + len(self.data) + 3 * TAG_SIZE)
+        self.assertEqual(self.storage.size(self.name), len(self.data))
+        self.assertEqual(self.read(), self.data)
+
+    def test_empty_file_round_trip(self):
+        name = self.storage.save('empty.txt', ContentFile(b''))
+        self.assertEqual(self.storage.size(name), 0)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'')
+
+    def test_range_read(self):
+        for start, length in ((0, 10), (SEGMENT_SIZE - 10, 100), (2 * SEGMENT_SIZE + 990, 100)):
+            with self.subTest(start=start):
+                self.assertEqual(self.read(start, length), self.data[start:start + length])
+
+    def test_truncation_is_detected(self):
+        from cryptography.exceptions import InvalidTag
+
+        # Dropping the final segment leaves a complete-looking file without its final flag.
+        os.truncate(self.path, HEADER_SIZE + 2 * (SEGMENT_SIZE + TAG_SIZE))
+        with self.assertRaises(InvalidTag):
+            self.read(SEGMENT_SIZE, 10)
+
+    def test_rewrap_after_key_rotation(self):
+        with override_settings(FILE_ENCRYPTION_KEYS={1: KEY_1, 2: KEY_2}, FILE_ENCRYPTION_ACTIVE_KEY_ID=2):
+            self.assertTrue(rewrap(self.path))
+            self.assertFalse(rewrap(self.path))
+        with open(self.path, 'rb') as raw:
+            self.assertEqual(Header.parse(raw.read(HEADER_SIZE)).key_id, 2)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['report.docx'])
+        # The old key is no longer needed.
+        with override_settings(FILE_ENCRYPTION_KEYS={2: KEY_2}, FILE_ENCRYPTION_ACTIVE_KEY_ID=2):
+            self.assertEqual(self.read(), self.data)
+
+
+@skipIf(importlib.util.find_spec('cryptography') is None, 'cryptography is not installed')
+@override_settings(FILE_ENCRYPTION_KEYS={1: KEY_1}, FILE_ENCRYPTION_ACTIVE_KEY_ID=1, DATABASE_REPLICAS=[])
+class ChunkEncryptionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.document = Document.objects.create(owner=ops, title='Document')
+        self.data = random.Random(0).randbytes(600 * 1024)
+        self.first = store_version(self.document, SimpleUploadedFile('a.docx', self.data), ops)
+        self.second = store_version(self.document, SimpleUploadedFile('a.docx', self.data), ops)
+
+    def test_chunks_are_encrypted_at_rest(self):
+        digests = list(self.first.chunk_entries.values_list('chunk_id', flat=True))
+        self.assertGreater(len(digests), 1)
+        for digest in digests:
+            with open(upload_storage.path(chunk_path(digest)), 'rb') as raw:
+                stored = raw.read()
+            plaintext = read_chunk(digest)
+            self.assertTrue(stored.startswith(MAGIC))
+            self.assertNotIn(plaintext[:64], stored)
+        self.assertEqual(b''.join(iter_version(self.first)), self.data)
+
+    def test_identical_chunks_are_stored_once(self):
+        self.assertGreater(self.first.stored_size, 0)
+        self.assertEqual(self.second.stored_size, 0)
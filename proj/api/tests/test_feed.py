@@ -0,0 +1,145 @@
+from unittest import mock
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from fileshare_common import tokens
+
+from ..models import FileAccessGrant, FileChange, FileUpload, User
+from .utils import auth_header, first_event
+
+
+class FeedTestMixin:
+    def setUp(self):
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.client_user = User.objects.create_user(
+            'client', 'client@example.com', 'pw', role='client', email_verified=True
+        )
+
+    def upload(self, name, grant=True):
+        upload = FileUpload.objects.create(uploader=self.ops, file=f'uploads/{name}.docx', assignment_id=name)
+        if grant:
+            FileAccessGrant.objects.create(file=upload, user=self.client_user)
+        return upload
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class ChangeFeedTests(FeedTestMixin, TestCase):
+    def changes(self, since, limit):
+        response = self.client.get(
+            reverse('client-file-changes'), {'since': since, 'limit': limit}, headers=auth_header(self.client_user)
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_the_cursor(self):
+        for name in ('a1', 'a2', 'a3'):
+            self.upload(name)
+        self.upload('hidden', grant=False)
+        latest = FileChange.objects.latest('seq').seq
+
+        first = self.changes(0, 2)
+        self.assertEqual([c['assignment_id'] for c in first['changes']], ['a1', 'a2'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual(first['cursor'], first['changes'][-1]['seq'])
+
+        second = self.changes(first['cursor'], 2)
+        self.assertEqual([c['assignment_id'] for c in second['changes']], ['a3'])
+        self.assertFalse(second['has_more'])
+        # The cursor moves past the entry this client may not see.
+        self.assertEqual(second['cursor'], latest)
+        self.assertEqual(self.changes(latest, 2), {'changes': [], 'cursor': latest, 'has_more': False})
+
+    def actions(self, user, since):
+        response = self.client.get(reverse('client-file-changes'), {'since': since}, headers=auth_header(user))
+        self.assertEqual(response.status_code, 200)
+        return [(c['action'], c['assignment_id']) for c in response.json()['changes']]
+
+    def revoke(self, **grantees):
+        response = self.client.post(
+            reverse('ops-revoke-files'), {'assignment_ids': ['a1'], **grantees},
+            content_type='application/json', headers=auth_header(self.ops),
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_deletes_only_reach_clients_who_had_access(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw', role='client', email_verified=True)
+        upload = self.upload('a1')
+        self.upload('b1', grant=False)
+        FileAccessGrant.objects.create(file=FileUpload.objects.get(assignment_id='b1'), user=other)
+        since = FileChange.objects.latest('seq').seq
+        upload.delete()
+        self.assertEqual(self.actions(self.client_user, since), [('delete', 'a1')])
+        self.assertEqual(self.actions(other, since), [])
+
+    def test_revoking_tells_only_those_who_lost_access(self):
+        team = Group.objects.create(name='team')
+        other = User.objects.create_user('other', 'other@example.com', 'pw', role='client', email_verified=True)
+        bystander = User.objects.create_user('bystander', 'by@example.com', 'pw', role='client', email_verified=True)
+        self.client_user.groups.add(team)
+        other.groups.add(team)
+        FileAccessGrant.objects.create(file=self.upload('a1'), group=team)
+        since = FileChange.objects.latest('seq').seq
+        # Still granted through the group.
+        self.revoke(usernames=['client'])
+        self.assertEqual(self.actions(self.client_user, since), [])
+        self.revoke(groups=['team'])
+        self.assertEqual(self.actions(other, since), [('delete', 'a1')])
+        # Both revocations are news to this client now; deletes are idempotent.
+        self.assertEqual(set(self.actions(self.client_user, since)), {('delete', 'a1')})
+        self.assertEqual(self.actions(bystander, since), [])
+
+    def test_reissued_ids_replace_the_old_ones(self):
+        upload = self.upload('a1')
+        since = FileChange.objects.latest('seq').seq
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+        response = self.client.post(
+            reverse('admin:api_fileupload_changelist'), {'action': 'reissue_links', '_selected_action': [upload.pk]}
+        )
+        self.assertEqual(response.status_code, 302)
+        upload.refresh_from_db()
+        self.assertEqual(self.actions(self.client_user, since), [('delete', 'a1'), ('add', upload.assignment_id)])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('client-file-changes'), {'since': 'x'}, headers=auth_header(self.client_user))
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_link_opens_stream_without_authorization_header(self):
+        self.upload('a1')
+        response = self.client.get(reverse('client-file-changes-stream-link'), headers=auth_header(self.client_user))
+        self.assertEqual(response.status_code, 200)
+        link = urlsplit(response.json()['stream-link'])
+        self.assertEqual(link.path, reverse('client-file-changes-stream'))
+
+        stream = self.client.get(f'{link.path}?{link.query}&since=0')
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(stream['Content-Type'], 'text/event-stream')
+        self.assertIn(b'"assignment_id": "a1"', async_to_sync(first_event)(stream))
+
+    def test_stream_rejects_bad_tokens(self):
+        stream_url = reverse('client-file-changes-stream')
+        other_purpose = tokens.sign('verify-email', self.client_user.pk, expires_in=60)
+        expired = tokens.sign('change-stream', self.client_user.pk, expires_in=-1)
+        not_a_client = tokens.sign('change-stream', self.ops.pk, expires_in=60)
+        for token in ('garbage', other_purpose, expired, not_a_client):
+            with self.subTest(token=token):
+                self.assertEqual(self.client.get(stream_url, {'token': token}).status_code, 403)
+        self.assertEqual(self.client.get(stream_url).status_code, 403)
+
+
+class ChangeAtomicityTests(FeedTestMixin, TransactionTestCase):
+    def test_upload_rolls_back_when_its_change_cannot_be_written(self):
+        with mock.patch.object(FileChange.objects, 'append', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.upload('a1', grant=False)
+        self.assertFalse(FileUpload.objects.exists())
+
+    def test_upload_and_change_commit_together(self):
+        upload = self.upload('a1', grant=False)
+        self.assertEqual(
+            list(FileChange.objects.values_list('file_id', 'action')), [(upload.pk, 'add')]
+        )
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import lifecycle
+from ..encryption import upload_storage
+from ..models import Chunk, Document, FileAccessGrant, FileUpload, User
+from ..versioning import chunk_path, store_version
+from ..views import download_token
+from .utils import auth_header
+
+
+@override_settings(DATABASE_REPLICAS=[], FILE_ENCRYPTION_KEYS={})
+class LifecycleTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root, FILE_LIFECYCLE={'COLD_STORAGE_ROOT': os.path.join(media_root, 'cold')},
+        ))
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.client_user = User.objects.create_user('client', 'client@example.com', 'pw', role='client', email_verified=True)
+        self.upload = FileUpload.objects.create(
+            uploader=self.ops, file=ContentFile(b'report', name='report.docx'), assignment_id='report'
+        )
+        FileAccessGrant.objects.create(file=self.upload, user=self.client_user)
+
+    def freeze(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(lifecycle.freeze([self.upload]), 1)
+
+    def read(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            with lifecycle.open_for_download(upload) as fileobj:
+                return fileobj.read()
+
+    def test_access_time_is_written_at_most_once_per_resolution(self):
+        stale = timezone.now() - timedelta(hours=2)
+        FileUpload.objects.filter(pk=self.upload.pk).update(last_accessed_at=stale)
+        self.upload.refresh_from_db()
+        with self.assertNumQueries(1):
+            lifecycle.touch(self.upload)
+        with self.assertNumQueries(0):
+            lifecycle.touch(self.upload)
+        # Another worker holding the stale row does not write again.
+        other = FileUpload.objects.get(pk=self.upload.pk)
+        other.last_accessed_at = stale
+        lifecycle.touch(other)
+        self.assertEqual(FileUpload.objects.get(pk=self.upload.pk).last_accessed_at, self.upload.last_accessed_at)
+
+    def test_freeze_keeps_the_hot_copy_until_commit(self):
+        hot_path = self.upload.file.path
+        with self.captureOnCommitCallbacks() as callbacks:
+            lifecycle.freeze([self.upload])
+        self.assertTrue(os.path.exists(hot_path))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(hot_path))
+        self.assertTrue(lifecycle.cold_storage().exists(self.upload.file.name))
+
+    def test_download_of_a_file_frozen_after_the_row_was_read(self):
+        stale_row = FileUpload.objects.get(pk=self.upload.pk)
+        self.freeze()
+        self.assertEqual(self.read(stale_row), b'report')
+        self.assertEqual(FileUpload.objects.get(pk=self.upload.pk).tier, FileUpload.TIER_HOT)
+        self.assertFalse(lifecycle.cold_storage().exists(self.upload.file.name))
+
+    def test_purge_skips_files_downloaded_since_the_batch_was_read(self):
+        cutoff = timezone.now() - timedelta(days=30)
+        FileUpload.objects.filter(pk=self.upload.pk).update(last_accessed_at=cutoff - timedelta(days=1))
+        batch = [FileUpload.objects.get(pk=self.upload.pk)]
+        self.read(FileUpload.objects.get(pk=self.upload.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(lifecycle.purge(batch, cutoff), 0)
+        self.assertTrue(FileUpload.objects.filter(pk=self.upload.pk).exists())
+        self.assertTrue(os.path.exists(self.upload.file.path))
+
+    def test_purge_deletes_the_blob_from_its_current_tier(self):
+        self.freeze()
+        batch = [FileUpload.objects.get(pk=self.upload.pk)]
+        # Rehydrated after the sweep read the row as cold.
+        with self.captureOnCommitCallbacks(execute=True):
+            lifecycle.rehydrate(FileUpload.objects.get(pk=self.upload.pk))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(lifecycle.purge(batch), 1)
+        self.assertTrue(os.path.exists(self.upload.file.path))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(self.upload.file.path))
+        self.assertFalse(lifecycle.cold_storage().exists(self.upload.file.name))
+
+    def test_missing_blob_is_not_found(self):
+        default_storage.delete(self.upload.file.name)
+        token = download_token(self.upload.pk, self.upload.assignment_id, self.client_user.pk)
+        response = self.client.get(
+            reverse('client-download-file', args=[token]),
+            headers=auth_header(self.client_user),
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=[], FILE_ENCRYPTION_KEYS={})
+class ChunkCollectionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.addCleanup(cache.clear)
+        ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.document = Document.objects.create(owner=ops, title='Report')
+        self.store = lambda data: store_version(self.document, SimpleUploadedFile('report.docx', data), ops)
+
+    def digests(self, version):
+        return set(version.chunk_entries.values_list('chunk_id', flat=True))
+
+    def test_unused_chunks_are_deleted_after_the_grace_period(self):
+        first = self.store(b'first')
+        second = self.store(b'second')
+        (orphan,) = self.digests(first)
+        first.delete()
+        now = timezone.now()
+        self.assertEqual(lifecycle.sweep(now=now)['chunks'], 0)
+        self.assertIsNotNone(Chunk.objects.get(pk=orphan).orphaned_at)
+        self.assertEqual(lifecycle.sweep(now=now + timedelta(hours=25))['chunks'], 1)
+        self.assertFalse(Chunk.objects.filter(pk=orphan).exists())
+        self.assertFalse(upload_storage.exists(chunk_path(orphan)))
+        self.assertTrue(Chunk.objects.filter(pk__in=self.digests(second)).exists())
+
+    def test_reused_chunk_is_no_longer_an_orphan(self):
+        first = self.store(b'first')
+        (digest,) = self.digests(first)
+        first.delete()
+        lifecycle.sweep()
+        again = self.store(b'first')
+        self.assertEqual(again.stored_size, 0)
+        self.assertIsNone(Chunk.objects.get(pk=digest).orphaned_at)
+        self.assertEqual(lifecycle.sweep(now=timezone.now() + timedelta(hours=25))['chunks'], 0)
+
+    def test_orphans_are_marked_in_budgeted_batches(self):
+        versions = [self.store(f'version {i}'.encode()) for i in range(3)]
+        orphans = set()
+        for version in versions:
+            orphans |= self.digests(version)
+            version.delete()
+        now = timezone.now()
+        # One page of one chunk per batch; each sweep picks up where the last stopped.
+        for marked in range(1, 4):
+            self.assertEqual(lifecycle.collect_chunks(1, now, budget=1), (0, 1))
+            self.assertEqual(Chunk.objects.filter(orphaned_at__isnull=False).count(), marked)
+        # Past the last chunk the cursor starts over.
+        self.assertEqual(lifecycle.collect_chunks(1, now, budget=1), (0, 1))
+        self.assertEqual(cache.get(lifecycle._ORPHAN_CURSOR_KEY), '')
+        # Deletes use the budget first.
+        self.assertEqual(lifecycle.collect_chunks(2, now + timedelta(hours=25), budget=1), (2, 1))
+        self.assertEqual(Chunk.objects.filter(pk__in=orphans).count(), 1)
@@ -0,0 +1,120 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from fileshare_common.onboarding import InvalidRecord, read_records
+
+from ..models import User
+from ..onboarding import import_clients
+from .utils import auth_header
+
+FAST_HASHING = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+
+class ReadRecordsTests(SimpleTestCase):
+    def test_jsonl_reports_unreadable_lines_in_place(self):
+        lines = '{"username": "a"}\n{"username": \n\n[1, 2]\n"text"\n{"username": "b"}\n'
+        records = list(read_records(io.StringIO(lines), 'jsonl'))
+        self.assertEqual(
+            [type(record) for record in records], [dict, InvalidRecord, InvalidRecord, InvalidRecord, dict]
+        )
+        self.assertIn('Invalid JSON', records[1].error)
+        self.assertEqual(records[2].error, 'Each line must be a JSON object.')
+        self.assertEqual(records[4], {'username': 'b'})
+
+    def test_csv_reports_unreadable_rows_in_place(self):
+        rows = 'username,email\na,a@example.com\n"' + 'x' * 200000 + '",b@example.com\nc,c@example.com\n'
+        records = list(read_records(io.StringIO(rows), 'csv'))
+        self.assertEqual(records[0], {'username': 'a', 'email': 'a@example.com'})
+        self.assertIsInstance(records[1], InvalidRecord)
+        self.assertEqual(records[-1], {'username': 'c', 'email': 'c@example.com'})
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            list(read_records(io.StringIO(''), 'xml'))
+
+
+@FAST_HASHING
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', DATABASE_REPLICAS=[])
+class ImportClientsTests(TestCase):
+    def test_summary_counts_and_row_errors(self):
+        User.objects.create_user('existing', 'existing@example.com', 'pw', role='client')
+        records = [
+            {'username': 'alice', 'email': 'alice@example.com', 'password': 'A-long-enough-pw-42'},
+            {'username': 'bob', 'email': 'bob@example.com'},
+            {'username': 'existing', 'email': 'other@example.com'},
+            {'username': 'alice', 'email': 'again@example.com'},
+            InvalidRecord('Invalid JSON: oops'),
+            {'username': 123, 'email': 'number@example.com'},
+            {'username': 'carol', 'email': ['carol@example.com']},
+            {'username': 'dave'},
+            {'username': 'erin', 'email': 'erin@example.com', 'password': 'pw'},
+        ]
+        summary = import_clients(records, chunk_size=4, workers=1, base_url='https://files.example.com/')
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['skipped'], 2)
+        self.assertEqual([error['row'] for error in summary['errors']], [5, 6, 7, 8, 9])
+        self.assertEqual(summary['errors'][0]['errors'], ['Invalid JSON: oops'])
+        self.assertEqual(summary['errors'][1]['errors'], ['username must be a string.'])
+        self.assertEqual(summary['errors'][2]['errors'], ['email must be a string.'])
+
+        alice, bob = User.objects.get(username='alice'), User.objects.get(username='bob')
+        self.assertEqual((alice.role, alice.email_verified), ('client', False))
+        self.assertTrue(alice.check_password('A-long-enough-pw-42'))
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['alice@example.com', 'bob@example.com'])
+        self.assertIn(f"https://files.example.com{reverse('client-verify-email')}?token=", mail.outbox[0].body)
+
+    def test_single_worker_hashes_in_process(self):
+        with mock.patch('fileshare_common.onboarding.ProcessPoolExecutor', side_effect=AssertionError):
+            summary = import_clients(
+                [{'username': 'alice', 'email': 'alice@example.com', 'password': 'A-long-enough-pw-42'}],
+                workers=1, send_email=False,
+            )
+        self.assertEqual(summary['created'], 1)
+
+    def test_no_pool_without_passwords(self):
+        with mock.patch('fileshare_common.onboarding.ProcessPoolExecutor', side_effect=AssertionError):
+            summary = import_clients([{'username': 'alice', 'email': 'alice@example.com'}], workers=4, send_email=False)
+        self.assertEqual(summary['created'], 1)
+
+    def test_endpoint_reports_bad_lines(self):
+        admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        lines = b'{"username": "alice", "email": "alice@example.com"}\nnot json\n[]\n'
+        response = self.client.post(
+            reverse('admin-import-clients'), {'file': SimpleUploadedFile('clients.jsonl', lines), 'send_email': 'false'},
+            headers=auth_header(admin),
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [2, 3])
+        self.assertEqual(mail.outbox, [])
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('username,email\nalice,alice@example.com\nbob,\n')
+        self.addCleanup(os.remove, handle.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_clients', handle.name, '--workers', '1', '--no-email', stdout=out, stderr=err)
+        self.assertIn('Created 1 clients, skipped 0 existing, 1 invalid.', out.getvalue())
+        self.assertIn('row 2: username and email are required.', err.getvalue())
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', DATABASE_REPLICAS=[])
+class ImportClientsPoolTests(TestCase):
+    def test_passwords_hashed_in_spawned_workers(self):
+        records = [
+            {'username': f'client{i}', 'email': f'client{i}@example.com', 'password': f'A-long-enough-pw-{i}'}
+            for i in range(3)
+        ]
+        summary = import_clients(records, workers=2, send_email=False)
+        self.assertEqual(summary['created'], 3)
+        for i in range(3):
+            self.assertTrue(User.objects.get(username=f'client{i}').check_password(f'A-long-enough-pw-{i}'))
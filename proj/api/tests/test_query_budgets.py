@@ -0,0 +1,268 @@
+"""
+Query budgets for every endpoint in fileshare/urls.py; see fileshare_common.testing.
+"""
+import shutil
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from fileshare_common import tokens
+from fileshare_common.admission import admission
+from fileshare_common.testing import QueryBudgetMixin
+
+from ..encryption import upload_storage
+from ..models import (
+    Chunk, Document, DocumentAccessGrant, DocumentVersion, FileAccessGrant, FileUpload, User, VersionChunk,
+)
+from ..versioning import chunk_path
+from ..views import VERIFY_LINK_MAX_AGE, download_token
+from .utils import auth_header, first_event
+
+BUDGETS = {
+    'homepage': 0,
+    'admin': 6,
+    'client-signup': 3,
+    'client-verify-email': 2,
+    'client-login': 1,
+    'client-list-files': 2,
+    'client-file-changes': 3,
+    'client-file-changes-poll': 4,
+    'client-file-changes-stream': 4,
+    'client-file-changes-stream-link': 1,
+    'client-download-link': 2,
+    'client-download-links': 2,
+    'client-download-file': 2,
+    'client-list-documents': 2,
+    'client-document-versions': 2,
+    'client-document-manifest': 3,
+    'client-document-download': 3,
+    'client-chunk': 2,
+    'admin-import-clients': 5,
+    'ops-login': 1,
+    'ops-upload': 3,
+    'ops-grant-files': 9,
+    'ops-revoke-files': 9,
+    'ops-create-document': 13,
+    'ops-upload-document-version': 11,
+}
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    budgets = BUDGETS
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            # Seeded rows are never committed, so only the primary's connection sees them.
+            DATABASE_REPLICAS=[],
+            FILE_ENCRYPTION_KEYS={},
+            UPLOAD_ADMISSION={'MIN_FREE_BYTES': 0},
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def seed(self, scale):
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.client_user = User.objects.create_user(
+            'client', 'client@example.com', 'pw', role='client', email_verified=True
+        )
+        self.files = [
+            FileUpload.objects.create(
+                uploader=self.ops, file=ContentFile(b'x' * 64, name=f'report{i}.docx'), assignment_id=f'{i + 1:032x}'
+            )
+            for i in range(scale)
+        ]
+        FileAccessGrant.objects.bulk_create(
+            FileAccessGrant(file=upload, user=self.client_user) for upload in self.files
+        )
+        self.documents = Document.objects.bulk_create(
+            Document(owner=self.ops, title=f'Document {i}') for i in range(scale)
+        )
+        DocumentAccessGrant.objects.bulk_create(
+            DocumentAccessGrant(document=document, user=self.client_user) for document in self.documents
+        )
+        chunks = []
+        for i in range(scale):
+            data = f'chunk {i}'.encode()
+            digest = f'{i:064x}'
+            upload_storage.save(chunk_path(digest), ContentFile(data))
+            chunks.append(Chunk(digest=digest, size=len(data)))
+        Chunk.objects.bulk_create(chunks)
+        self.chunks = chunks
+        size = sum(chunk.size for chunk in chunks)
+        versions = DocumentVersion.objects.bulk_create(
+            DocumentVersion(
+                document=self.documents[0], number=number, uploader=self.ops, original_filename='document.docx',
+                size=size, stored_size=size, sha256='0' * 64,
+            )
+            for number in range(1, scale + 1)
+        )
+        offsets = [sum(chunk.size for chunk in chunks[:i]) for i in range(scale)]
+        VersionChunk.objects.bulk_create(
+            VersionChunk(version=version, position=i, chunk=chunk, offset=offsets[i])
+            for version in versions
+            for i, chunk in enumerate(chunks)
+        )
+
+    # One method per URL name; each prepares its request and returns a callable that makes it.
+
+    def call_homepage(self, scale):
+        return lambda: self.client.get('/')
+
+    def call_admin(self, scale):
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'pw'))
+        return lambda: self.client.get(reverse('admin:api_fileupload_changelist'))
+
+    def call_client_signup(self, scale):
+        data = {'username': 'newclient', 'email': 'new@example.com', 'password': 'A-long-enough-pw-42'}
+        return lambda: self.client.post(reverse('client-signup'), data)
+
+    def call_client_verify_email(self, scale):
+        token = tokens.sign('verify-email', self.client_user.pk, expires_in=VERIFY_LINK_MAX_AGE)
+        return lambda: self.client.get(reverse('client-verify-email'), {'token': token})
+
+    def call_client_login(self, scale):
+        return lambda: self.client.post(reverse('client-login'), {'username': 'client', 'password': 'pw'})
+
+    def call_client_list_files(self, scale):
+        return lambda: self.client.get(reverse('client-list-files'), headers=auth_header(self.client_user))
+
+    def call_client_file_changes(self, scale):
+        return lambda: self.client.get(
+            reverse('client-file-changes'), {'since': 0}, headers=auth_header(self.client_user)
+        )
+
+    def call_client_file_changes_poll(self, scale):
+        return lambda: self.client.get(
+            reverse('client-file-changes-poll'), {'since': 0, 'timeout': 1}, headers=auth_header(self.client_user)
+        )
+
+    def call_client_file_changes_stream(self, scale):
+        return lambda: self.client.get(
+            reverse('client-file-changes-stream'), {'since': 0}, headers=auth_header(self.client_user)
+        )
+
+    def call_client_file_changes_stream_link(self, scale):
+        return lambda: self.client.get(reverse('client-file-changes-stream-link'), headers=auth_header(self.client_user))
+
+    def call_client_download_link(self, scale):
+        return lambda: self.client.get(
+            reverse('client-download-link', args=[self.files[-1].assignment_id]), headers=auth_header(self.client_user)
+        )
+
+    def call_client_download_links(self, scale):
+        data = {'assignment_ids': [upload.assignment_id for upload in self.files]}
+        return lambda: self.client.post(
+            reverse('client-download-links'), data, content_type='application/json', headers=auth_header(self.client_user)
+        )
+
+    def call_client_download_file(self, scale):
+        upload = self.files[-1]
+        token = download_token(upload.pk, upload.assignment_id, self.client_user.pk)
+        return lambda: self.client.get(reverse('client-download-file', args=[token]), headers=auth_header(self.client_user))
+
+    def call_client_list_documents(self, scale):
+        return lambda: self.client.get(reverse('client-list-documents'), headers=auth_header(self.client_user))
+
+    def call_client_document_versions(self, scale):
+        return lambda: self.client.get(
+            reverse('client-document-versions', args=[self.documents[0].pk]), headers=auth_header(self.client_user)
+        )
+
+    def call_client_document_manifest(self, scale):
+        return lambda: self.client.get(
+            reverse('client-document-manifest', args=[self.documents[0].pk, scale]), headers=auth_header(self.client_user)
+        )
+
+    def call_client_document_download(self, scale):
+        return lambda: self.client.get(
+            reverse('client-document-download', args=[self.documents[0].pk, scale]), headers=auth_header(self.client_user)
+        )
+
+    def call_client_chunk(self, scale):
+        return lambda: self.client.get(
+            reverse('client-chunk', args=[self.chunks[-1].digest]), headers=auth_header(self.client_user)
+        )
+
+    def call_admin_import_clients(self, scale):
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        rows = ''.join(f'imported{i},imported{i}@example.com\n' for i in range(scale))
+        upload = SimpleUploadedFile('clients.csv', ('username,email\n' + rows).encode())
+        return lambda: self.client.post(reverse('admin-import-clients'), {'file': upload}, headers=auth_header(admin_user))
+
+    def call_ops_login(self, scale):
+        return lambda: self.client.post(reverse('ops-login'), {'username': 'ops', 'password': 'pw'})
+
+    def call_ops_upload(self, scale):
+        upload = SimpleUploadedFile('new.docx', b'x' * 64)
+        return lambda: self.client.post(reverse('ops-upload'), {'file': upload}, headers=auth_header(self.ops))
+
+    def _grant_data(self, scale):
+        clients = User.objects.bulk_create(
+            User(username=f'grantee{i}', email=f'grantee{i}@example.com', role='client') for i in range(scale)
+        )
+        return {
+            'assignment_ids': [upload.assignment_id for upload in self.files],
+            'document_ids': [document.pk for document in self.documents],
+            'usernames': [user.username for user in clients],
+        }
+
+    def call_ops_grant_files(self, scale):
+        data = self._grant_data(scale)
+        return lambda: self.client.post(
+            reverse('ops-grant-files'), data, content_type='application/json', headers=auth_header(self.ops)
+        )
+
+    def call_ops_revoke_files(self, scale):
+        data = self._grant_data(scale)
+        return lambda: self.client.post(
+            reverse('ops-revoke-files'), data, content_type='application/json', headers=auth_header(self.ops)
+        )
+
+    def call_ops_create_document(self, scale):
+        upload = SimpleUploadedFile('new.docx', b'new document ' * scale)
+        return lambda: self.client.post(reverse('ops-create-document'), {'file': upload}, headers=auth_header(self.ops))
+
+    def call_ops_upload_document_version(self, scale):
+        upload = SimpleUploadedFile('new.docx', b'new version ' * scale)
+        return lambda: self.client.post(
+            reverse('ops-upload-document-version', args=[self.documents[0].pk]), {'file': upload},
+            headers=auth_header(self.ops),
+        )
+
+    def consume(self, name, response):
+        if name == 'client-file-changes-stream':
+            self.assertTrue(async_to_sync(first_event)(response))
+        else:
+            super().consume(name, response)
+
+    def test_upload_with_project_settings(self):
+        # The budgets run against a temporary MEDIA_ROOT with admission relaxed;
+        # this upload goes through the settings the project actually ships with.
+        self.settings_override.disable()
+        self.addCleanup(self.settings_override.enable)
+        ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        upload = SimpleUploadedFile('new.docx', b'x' * 64)
+        config = admission.config()
+        response = self.client.post(reverse('ops-upload'), {'file': upload}, headers=auth_header(ops))
+        if admission._free_bytes() - config['MIN_FREE_BYTES'] > 1024 * 1024:
+            self.assertEqual(response.status_code, 201, response.content)
+            stored = FileUpload.objects.get(pk=response.json()['id']).file
+            self.addCleanup(stored.delete, save=False)
+            self.assertTrue(stored.storage.exists(stored.name))
+            self.assertTrue(stored.path.startswith(str(settings.MEDIA_ROOT)))
+        else:
+            self.assertEqual(response.status_code, 503)
@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from fileshare.warmup import DEFERRED_MODULES
+
+# A fresh worker on the API profile: app registry, URLconf and views, then warm-up.
+# SQLite stands in for PostgreSQL so no database driver is needed.
+_WORKER = '''
+import importlib, json, os, sys
+profile = importlib.import_module('fileshare.settings_api')
+profile.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+profile.DATABASE_REPLICAS = []
+os.environ['DJANGO_SETTINGS_MODULE'] = 'fileshare.settings_api'
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+modules = sys.argv[1:]
+started = [name for name in modules if name in sys.modules]
+from fileshare.warmup import warm_up
+warm_up()
+print(json.dumps({'started': started, 'warmed': [name for name in modules if name in sys.modules]}))
+'''
+
+DEFERRED = (
+    *DEFERRED_MODULES,
+    'concurrent.futures.process',
+    'django.contrib.sessions.middleware',
+    'django.contrib.messages.middleware',
+    'numpy',
+)
+
+
+class StartupTests(SimpleTestCase):
+    def test_api_profile_defers_modules_until_needed(self):
+        result = subprocess.run(
+            [sys.executable, '-c', _WORKER, *DEFERRED], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        loaded = json.loads(result.stdout.splitlines()[-1])
+        self.assertEqual(loaded['started'], [])
+        # warm_up() loads the deferred modules before workers are forked.
+        self.assertEqual(set(loaded['warmed']) & set(DEFERRED_MODULES), set(DEFERRED_MODULES))
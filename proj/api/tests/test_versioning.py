@@ -0,0 +1,125 @@
+import hashlib
+import importlib.util
+import io
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import versioning
+from ..models import Chunk, Document, User
+from ..versioning import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, iter_chunks, iter_version, store_version
+
+
+def _random_bytes(size, seed=0):
+    return random.Random(seed).randbytes(size)
+
+
+def _reference_chunks(data):
+    """The byte-at-a-time definition of the cut points."""
+    chunks = []
+    while data:
+        end = min(len(data), MAX_CHUNK_SIZE)
+        cut = end
+        h = 0
+        for i in range(MIN_CHUNK_SIZE, end):
+            h = ((h << 1) + versioning._GEAR[data[i]]) & versioning._WORD
+            if not h & versioning._MASK:
+                cut = i + 1
+                break
+        chunks.append(data[:cut])
+        data = data[cut:]
+    return chunks
+
+
+def _chunks(data):
+    return list(iter_chunks(io.BytesIO(data)))
+
+
+class ChunkingTests(SimpleTestCase):
+    sizes = (0, 20, 100, MIN_CHUNK_SIZE, MIN_CHUNK_SIZE + 1, MAX_CHUNK_SIZE + 5, 3 * 1024 * 1024)
+
+    def assert_matches_reference(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                data = _random_bytes(size)
+                self.assertEqual(_chunks(data), _reference_chunks(data))
+
+    @skipIf(importlib.util.find_spec('numpy') is None, 'numpy is not installed')
+    def test_vectorized_cut_points_match_reference(self):
+        self.assert_matches_reference()
+        # Repetitive data cuts at MAX_CHUNK_SIZE or inside the first bytes past the minimum.
+        for data in (bytes(MAX_CHUNK_SIZE * 3), b'ab' * MAX_CHUNK_SIZE):
+            self.assertEqual(_chunks(data), _reference_chunks(data))
+
+    def test_pure_python_cut_points_match_reference(self):
+        with mock.patch.object(versioning, '_GEAR_ARRAY', False):
+            self.assert_matches_reference()
+
+    def test_numpy_is_imported_on_first_use(self):
+        code = (
+            'import sys, django; django.setup(); import api.versioning; '
+            "assert 'numpy' not in sys.modules, 'numpy imported at start-up'"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_chunk_sizes_stay_in_bounds(self):
+        chunks = _chunks(_random_bytes(4 * 1024 * 1024))
+        self.assertTrue(all(MIN_CHUNK_SIZE <= len(chunk) <= MAX_CHUNK_SIZE for chunk in chunks[:-1]))
+
+    def test_boundaries_survive_an_insert(self):
+        data = _random_bytes(2 * 1024 * 1024)
+        edited = data[:1024 * 1024] + b'inserted' * 10 + data[1024 * 1024:]
+        before, after = _chunks(data), _chunks(edited)
+        self.assertEqual(b''.join(after), edited)
+        # Only the chunks around the edit change.
+        changed = set(after) - set(before)
+        self.assertLessEqual(len(changed), 2)
+        self.assertGreaterEqual(len(set(after) & set(before)), len(before) - 2)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class StoreVersionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.ops = User.objects.create_user('ops', 'ops@example.com', 'pw', role='ops')
+        self.document = Document.objects.create(owner=self.ops, title='Report')
+        self.data = _random_bytes(1024 * 1024)
+
+    def store(self, data):
+        return store_version(self.document, SimpleUploadedFile('report.docx', data), self.ops)
+
+    def test_reassembles_the_upload(self):
+        version = self.store(self.data)
+        self.assertEqual((version.number, version.size, version.stored_size), (1, len(self.data), len(self.data)))
+        self.assertEqual(version.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(b''.join(iter_version(version)), self.data)
+        entries = list(version.chunk_entries.order_by('position').values_list('offset', 'chunk__size'))
+        self.assertEqual([offset for offset, _ in entries], [sum(size for _, size in entries[:i]) for i in range(len(entries))])
+
+    def test_identical_upload_stores_nothing(self):
+        self.store(self.data)
+        chunks = Chunk.objects.count()
+        again = self.store(self.data)
+        self.assertEqual((again.number, again.stored_size), (2, 0))
+        self.assertEqual(Chunk.objects.count(), chunks)
+        self.assertEqual(b''.join(iter_version(again)), self.data)
+
+    def test_edit_stores_only_changed_chunks(self):
+        self.store(self.data)
+        edited = self.data[:500000] + b'new paragraph' + self.data[500000:]
+        version = self.store(edited)
+        self.assertGreater(version.stored_size, 0)
+        self.assertLessEqual(version.stored_size, 2 * MAX_CHUNK_SIZE)
+        self.assertEqual(b''.join(iter_version(version)), edited)
@@ -0,0 +1,16 @@
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def auth_header(user):
+    return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+
+async def first_event(response):
+    """The first event of a change stream; closes the stream."""
+    content = response.streaming_content
+    try:
+        async for chunk in content:
+            if chunk.startswith(b'id:'):
+                return chunk
+    finally:
+        await content.aclose()
@@ -0,0 +1,210 @@
+"""
+Document versions stored as content-defined chunks.
+
+Each upload is cut into variable-size chunks with a gear rolling hash
+(FastCDC style), so an edit in the middle of a file only changes the chunks
+around it. Chunks are stored once under their SHA-256 digest; a version is
+just the ordered list of its chunk digests. Downloads stream the chunks back
+in order, and clients that already hold some chunks can fetch the manifest
+and pull only the ones they lack. Chunks are written through the same
+storage as uploads, so they are encrypted at rest too; the digest is taken
+over the plaintext, so identical chunks are still stored once.
+
+Finding cut points byte by byte in Python runs at a few MB/s. With the
+optional ``numpy`` package installed, the hash is computed for a whole read
+buffer at once and the cut points are the same, only found much faster.
+"""
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max
+
+from .encryption import upload_storage
+from .models import Chunk, Document, DocumentVersion, VersionChunk
+
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+# 16 mask bits give an average chunk of about 64 KiB past the minimum.
+_MASK = ((1 << 16) - 1) << 40
+_WORD = (1 << 64) - 1
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+# Each step shifts the hash left by one, so the byte k steps back only reaches
+# bits k and up. The masked bits (40-55) thus depend on the last 56 bytes alone,
+# and from the 56th hashed byte on they match a hash over a fixed window.
+_EXACT_AFTER = _MASK.bit_length() - 1
+_READ_SIZE = 4 * 1024 * 1024
+_HASH_BLOCK = 32 * 1024
+_LOOKUP_BATCH = 64
+# _GEAR as a numpy array once first needed, False without numpy.
+_GEAR_ARRAY = None
+
+
+def _gear_array():
+    """
+    Return ``_GEAR`` as a numpy uint64 array, or None without numpy.
+
+    numpy is imported here rather than at module level: this module loads
+    with the views on every worker start, and most workers never chunk.
+    """
+    global _GEAR_ARRAY
+    if _GEAR_ARRAY is None:
+        try:
+            import numpy
+        except ImportError:  # Optional: cut points are then found in pure Python.
+            _GEAR_ARRAY = False
+        else:
+            _GEAR_ARRAY = numpy.array(_GEAR, dtype=numpy.uint64)
+    return _GEAR_ARRAY if _GEAR_ARRAY is not False else None
+
+
+def _window_candidates(buf):
+    """
+    Offsets in ``buf`` where the gear hash over the 64 bytes ending there
+    passes the mask, or None without numpy.
+
+    The windowed hash is built by doubling: the hash over 2n bytes is the one
+    over the last n plus the one n bytes earlier shifted left by n. uint64
+    arithmetic wraps like the ``& _WORD`` in ``_cut_point``. Blocks of
+    ``_HASH_BLOCK`` bytes keep the working arrays in the CPU cache.
+    """
+    gear = _gear_array()
+    if gear is None:
+        return None
+    import numpy
+
+    data = numpy.frombuffer(buf, dtype=numpy.uint8)
+    hashes = numpy.empty(_HASH_BLOCK + 63, dtype=numpy.uint64)
+    shifted = numpy.empty_like(hashes)
+    found = []
+    for block_start in range(0, len(data), _HASH_BLOCK):
+        # Start 63 bytes early so the block's first windows are complete.
+        low = max(block_start - 63, 0)
+        window = data[low:block_start + _HASH_BLOCK]
+        h = hashes[:len(window)]
+        numpy.take(gear, window, out=h)
+        span = 1
+        while span < min(64, len(h)):
+            n = len(h) - span
+            numpy.left_shift(h[:n], numpy.uint64(span), out=shifted[:n])
+            numpy.add(h[span:], shifted[:n], out=h[span:])
+            span *= 2
+        hits = numpy.flatnonzero((h & numpy.uint64(_MASK)) == 0) + low
+        found.append(hits[hits >= block_start])
+    return numpy.concatenate(found) if found else numpy.empty(0, dtype=numpy.intp)
+
+
+def _cut_point(buf, start, candidates=None):
+    """Length of the chunk that starts at ``start`` in ``buf``."""
+    end = min(len(buf), start + MAX_CHUNK_SIZE)
+    first = start + MIN_CHUNK_SIZE
+    if end <= first:
+        return end - start
+    # Hash the first bytes one by one; past them ``candidates`` (if any) is exact.
+    exact = end if candidates is None else min(end, first + _EXACT_AFTER)
+    gear, mask, word = _GEAR, _MASK, _WORD
+    h = 0
+    for i in range(first, exact):
+        h = ((h << 1) + gear[buf[i]]) & word
+        if not h & mask:
+            return i + 1 - start
+    if candidates is not None:
+        index = candidates.searchsorted(exact)
+        if index < len(candidates) and candidates[index] < end:
+            return int(candidates[index]) + 1 - start
+    return end - start
+
+
+def iter_chunks(fileobj):
+    """Yield the content-defined chunks of a binary file object."""
+    buf = b''
+    start = 0
+    candidates = None
+    eof = False
+    while True:
+        if not eof and len(buf) - start < MAX_CHUNK_SIZE:
+            data = fileobj.read(_READ_SIZE)
+            if data:
+                buf = buf[start:] + data
+                start = 0
+                candidates = _window_candidates(buf)
+            else:
+                eof = True
+            continue
+        if start == len(buf):
+            return
+        cut = _cut_point(buf, start, candidates)
+        yield buf[start:start + cut]
+        start += cut
+
+
+def chunk_path(digest):
+    return f'chunks/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def _store_missing(batch):
+    """Persist the chunks in ``batch`` ({digest: data}) that are not stored yet."""
+    # Reused chunks are no longer orphans; see api.lifecycle.collect_chunks.
+    Chunk.objects.filter(digest__in=batch, orphaned_at__isnull=False).update(orphaned_at=None)
+    known = set(Chunk.objects.filter(digest__in=batch).values_list('digest', flat=True))
+    new = []
+    for digest, data in batch.items():
+        if digest in known:
+            continue
+        name = chunk_path(digest)
+        if not upload_storage.exists(name):
+            saved = upload_storage.save(name, ContentFile(data))
+            if saved != name:
+                # Lost a race with another upload of the same chunk.
+                upload_storage.delete(saved)
+        new.append(Chunk(digest=digest, size=len(data)))
+    Chunk.objects.bulk_create(new, ignore_conflicts=True)
+    return sum(chunk.size for chunk in new)
+
+
+def store_version(document, upload, uploader):
+    """Chunk ``upload`` into a new version of ``document`` and return it."""
+    entries, batch = [], {}
+    whole = hashlib.sha256()
+    offset = stored = 0
+    upload.open('rb')
+    for data in iter_chunks(upload):
+        digest = hashlib.sha256(data).hexdigest()
+        whole.update(data)
+        entries.append(VersionChunk(position=len(entries), chunk_id=digest, offset=offset))
+        offset += len(data)
+        batch[digest] = data
+        if len(batch) >= _LOOKUP_BATCH:
+            stored += _store_missing(batch)
+            batch = {}
+    if batch:
+        stored += _store_missing(batch)
+    with transaction.atomic():
+        # Lock the document so concurrent uploads get consecutive numbers.
+        Document.objects.select_for_update().filter(pk=document.pk).first()
+        latest = document.versions.aggregate(latest=Max('number'))['latest'] or 0
+        version = DocumentVersion.objects.create(
+            document=document,
+            number=latest + 1,
+            uploader=uploader,
+            original_filename=upload.name,
+            size=offset,
+            stored_size=stored,
+            sha256=whole.hexdigest(),
+        )
+        for entry in entries:
+            entry.version = version
+        VersionChunk.objects.bulk_create(entries)
+    return version
+
+
+def read_chunk(digest):
+    with upload_storage.open(chunk_path(digest), 'rb') as fh:
+        return fh.read()
+
+
+def iter_version(version):
+    """Stream a version's bytes back from its chunks."""
+    digests = list(version.chunk_entries.order_by('position').values_list('chunk_id', flat=True))
+    for digest in digests:
+        yield read_chunk(digest)
@@ -1,23 +1,56 @@
 from django.shortcuts import render
 from rest_framework import generics, permissions, status, views
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import Group
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.utils.encoding import force_bytes, force_str
+from django.utils.http import content_disposition_header
+from django.utils.http import urlsafe_base64_decode
+from django.utils.encoding import force_str
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
-from .models import FileUpload, User
+from fileshare.db_router import pin_to_primary
+from fileshare_common import tokens
+from fileshare_common.admission import UploadAdmissionMixin
+from .lifecycle import open_for_download
+from .feed import PAGE_SIZE, STREAM_TOKEN_MAX_AGE, changes_since, parse_cursor
+from .models import (
+    FileUpload, FileAccessGrant, FileChange, User, Document, DocumentAccessGrant, DocumentVersion, Chunk,
+    lost_access_changes,
+)
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer,
-    FileUploadSerializer, FileListSerializer
+    FileUploadSerializer, FileListSerializer, BatchDownloadLinkSerializer, FileGrantSerializer,
+    DocumentSerializer, DocumentVersionSerializer, DocumentUploadSerializer
 )
+from .versioning import iter_version, read_chunk, store_version
+import mimetypes
+import os
+import re
 import uuid
+import zlib
 
+# Links issued before the compact token format; drop once they have all expired.
 signer = TimestampSigner()
 
+DOWNLOAD_LINK_MAX_AGE = 60*30  # 30 minutes
+VERIFY_LINK_MAX_AGE = 60*60*24  # 24 hours
+
+def _assignment_check(assignment_id):
+    return zlib.crc32(assignment_id.encode())
+
+def download_token(file_pk, assignment_id, user_pk):
+    # The assignment id checksum lets the admin's reissue action void outstanding links.
+    return tokens.sign(
+        'download', file_pk, user_pk, _assignment_check(assignment_id), expires_in=DOWNLOAD_LINK_MAX_AGE
+    )
+
 # Create your views here.
 
 # Client User Signup
@@ -32,10 +65,9 @@ class ClientSignUpView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         # Send verification email
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        token = signer.sign(user.email)
+        token = tokens.sign('verify-email', user.pk, expires_in=VERIFY_LINK_MAX_AGE)
         verify_url = request.build_absolute_uri(
-            reverse('client-verify-email') + f'?uid={uid}&token={token}'
+            reverse('client-verify-email') + f'?token={token}'
         )
         send_mail(
             'Verify your email',
@@ -52,17 +84,46 @@ class ClientVerifyEmailView(views.APIView):
 
     def get(self, request):
         uid = request.GET.get('uid')
-        token = request.GET.get('token')
+        token = request.GET.get('token') or ''
+        # The account may have been created moments ago; don't trust replica lag.
+        pin_to_primary()
         try:
-            uid = force_str(urlsafe_base64_decode(uid))
+            if uid:
+                uid = force_str(urlsafe_base64_decode(uid))
+                signer.unsign(token, max_age=VERIFY_LINK_MAX_AGE)
+            else:
+                (uid,) = tokens.unsign('verify-email', token)
             user = User.objects.get(pk=uid, role='client')
-            signer.unsign(token, max_age=60*60*24)  # 24 hours
             user.email_verified = True
             user.save()
             return Response({'message': 'Email verified successfully.'})
-        except (User.DoesNotExist, BadSignature, SignatureExpired):
+        except (User.DoesNotExist, BadSignature, SignatureExpired, ValueError):
             return Response({'message': 'Invalid or expired verification link.'}, status=400)
 
+# Admin: Bulk Client Import
+class ClientImportView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        # Imported on first use: pulls in multiprocessing and the process pool.
+        from .onboarding import import_clients, open_upload, read_records
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'message': 'Upload a .csv or .jsonl file as "file".'}, status=400)
+        stream, fmt = open_upload(upload)
+        try:
+            summary = import_clients(
+                read_records(stream, fmt),
+                workers=settings.CLIENT_IMPORT_REQUEST_WORKERS,
+                send_email=request.data.get('send_email', 'true').lower() != 'false',
+                base_url=request.build_absolute_uri('/'),
+            )
+        except ValueError as exc:
+            return Response({'message': f'Could not read import file: {exc}'}, status=400)
+        return Response(summary, status=201)
+
 # Login (Ops & Client)
 class UserLoginView(views.APIView):
     permission_classes = [permissions.AllowAny]
@@ -87,7 +148,7 @@ class UserLoginView(views.APIView):
         return Response({'message': 'Invalid credentials.'}, status=401)
 
 # Ops User File Upload
-class OpsFileUploadView(generics.CreateAPIView):
+class OpsFileUploadView(UploadAdmissionMixin, generics.CreateAPIView):
     serializer_class = FileUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -99,19 +160,103 @@ class OpsFileUploadView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(uploader=self.request.user)
 
+# Ops User Grant clients (or groups of clients) access to files and documents
+class OpsFileGrantView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    revoke = False
+
+    def post(self, request):
+        if request.user.role != 'ops':
+            return Response({'message': 'Only Ops users can manage file access.'}, status=403)
+        serializer = FileGrantSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        files = dict(
+            FileUpload.objects.filter(assignment_id__in=data['assignment_ids']).values_list('assignment_id', 'pk')
+        )
+        documents = set(Document.objects.filter(pk__in=data['document_ids']).values_list('pk', flat=True))
+        users = dict(
+            User.objects.filter(username__in=data['usernames'], role='client').values_list('username', 'pk')
+        )
+        groups = dict(Group.objects.filter(name__in=data['groups']).values_list('name', 'pk'))
+        grantees = [{'user_id': pk} for pk in users.values()] + [{'group_id': pk} for pk in groups.values()]
+        revoked = Q(user_id__in=users.values()) | Q(group_id__in=groups.values())
+        with transaction.atomic():
+            # Followers of the change feed learn about new and lost access like about uploads
+            # and deletes. Lost access is only news to the grantees it was taken from.
+            if not grantees:
+                changes = []
+            elif self.revoke:
+                file_grants = FileAccessGrant.objects.filter(revoked, file_id__in=files.values())
+                changes = lost_access_changes({pk: assignment_id for assignment_id, pk in files.items()}, grants=file_grants)
+                file_grants.delete()
+                DocumentAccessGrant.objects.filter(revoked, document_id__in=documents).delete()
+            else:
+                FileAccessGrant.objects.bulk_create([
+                    FileAccessGrant(file_id=pk, granted_by=request.user, **grantee)
+                    for pk in files.values()
+                    for grantee in grantees
+                ], batch_size=1000, ignore_conflicts=True)
+                DocumentAccessGrant.objects.bulk_create([
+                    DocumentAccessGrant(document_id=pk, granted_by=request.user, **grantee)
+                    for pk in documents
+                    for grantee in grantees
+                ], batch_size=1000, ignore_conflicts=True)
+                changes = [FileChange(file_id=pk, assignment_id=assignment_id, action='add') for assignment_id, pk in files.items()]
+            if changes:
+                FileChange.objects.append(changes)
+        return Response({
+            'files': len(files),
+            'documents': len(documents),
+            'usernames': len(users),
+            'groups': len(groups),
+            'missing': {
+                'assignment_ids': [a for a in data['assignment_ids'] if a not in files],
+                'document_ids': [d for d in data['document_ids'] if d not in documents],
+                'usernames': [u for u in data['usernames'] if u not in users],
+                'groups': [g for g in data['groups'] if g not in groups],
+            },
+            'message': 'success',
+        })
+
 # Client User List Files
 class ClientFileListView(generics.ListAPIView):
     serializer_class = FileListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return FileUpload.objects.all()
+        return FileUpload.objects.visible_to(self.request.user)
 
     def list(self, request, *args, **kwargs):
         if request.user.role != 'client':
             return Response({'message': 'Only client users can list files.'}, status=403)
         return super().list(request, *args, **kwargs)
 
+# Client User File Changes since a cursor
+class ClientFileChangesView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != 'client':
+            return Response({'message': 'Only client users can follow file changes.'}, status=403)
+        cursor = parse_cursor(request.GET.get('since'))
+        if cursor is None:
+            return Response({'message': 'Invalid cursor.'}, status=400)
+        limit = min(parse_cursor(request.GET.get('limit')) or PAGE_SIZE, 1000)
+        changes, cursor = changes_since(cursor, limit, user=request.user)
+        return Response({'changes': changes, 'cursor': cursor, 'has_more': len(changes) == limit})
+
+# Client User Get a link to the change stream that needs no Authorization header (EventSource)
+class ClientFileChangeStreamLinkView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != 'client':
+            return Response({'message': 'Only client users can follow file changes.'}, status=403)
+        token = tokens.sign('change-stream', request.user.pk, expires_in=STREAM_TOKEN_MAX_AGE)
+        stream_url = request.build_absolute_uri(reverse('client-file-changes-stream') + f'?token={token}')
+        return Response({'stream-link': stream_url, 'expires_in': STREAM_TOKEN_MAX_AGE, 'message': 'success'})
+
 # Client User Get Secure Download Link
 class ClientDownloadLinkView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -120,8 +265,8 @@ class ClientDownloadLinkView(views.APIView):
         if request.user.role != 'client':
             return Response({'message': 'Only client users can get download links.'}, status=403)
         try:
-            file_obj = FileUpload.objects.get(assignment_id=assignment_id)
-            token = signer.sign(f'{file_obj.assignment_id}:{request.user.pk}')
+            file_obj = FileUpload.objects.visible_to(request.user).get(assignment_id=assignment_id)
+            token = download_token(file_obj.pk, file_obj.assignment_id, request.user.pk)
             download_url = request.build_absolute_uri(
                 reverse('client-download-file', args=[token])
             )
@@ -129,19 +274,214 @@ class ClientDownloadLinkView(views.APIView):
         except FileUpload.DoesNotExist:
             return Response({'message': 'File not found.'}, status=404)
 
+# Client User Get Download Links for many files at once
+class ClientBatchDownloadLinkView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'client':
+            return Response({'message': 'Only client users can get download links.'}, status=403)
+        serializer = BatchDownloadLinkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requested = serializer.validated_data['assignment_ids']
+        found = dict(
+            FileUpload.objects.visible_to(request.user)
+            .filter(assignment_id__in=requested).values_list('assignment_id', 'pk')
+        )
+        # Build the URL prefix once; tokens are URL-safe and need no quoting.
+        placeholder = reverse('client-download-file', args=['token'])
+        prefix = request.build_absolute_uri(placeholder[:-len('token/')])
+        links = {
+            assignment_id: f'{prefix}{download_token(file_pk, assignment_id, request.user.pk)}/'
+            for assignment_id, file_pk in sorted(found.items())
+        }
+        missing = [assignment_id for assignment_id in requested if assignment_id not in found]
+        return Response({'download-links': links, 'missing': missing, 'message': 'success'})
+
 # Client User Download File
 from django.http import FileResponse
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+def ranged_file_response(request, fileobj, filename):
+    """FileResponse that also answers a single ``Range: bytes=`` request with 206."""
+    match = RANGE_RE.fullmatch(request.headers.get('Range', ''))
+    if not match or not (match[1] or match[2]):
+        response = FileResponse(fileobj, as_attachment=True, filename=filename)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+    size = fileobj.size
+    if match[1]:
+        start = int(match[1])
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+    else:
+        start, end = max(size - int(match[2]), 0), size - 1
+    if start > end:
+        fileobj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    # Seeking lets encrypted files decrypt only the segments in the range.
+    fileobj.seek(start)
+
+    def stream(remaining):
+        try:
+            while remaining > 0:
+                data = fileobj.read(min(remaining, 64 * 1024))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            fileobj.close()
+
+    response = StreamingHttpResponse(
+        stream(end - start + 1), status=206,
+        content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+    )
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Disposition'] = content_disposition_header(True, os.path.basename(filename))
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
 class ClientDownloadFileView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, token):
         try:
-            value = signer.unsign(token, max_age=60*30)  # 30 minutes
-            assignment_id, user_pk = value.split(':')
-            if str(request.user.pk) != user_pk or request.user.role != 'client':
+            check = None
+            if ':' in token:
+                value = signer.unsign(token, max_age=DOWNLOAD_LINK_MAX_AGE)
+                assignment_id, user_pk = value.split(':')
+                lookup = {'assignment_id': assignment_id}
+            else:
+                file_pk, user_pk, check = tokens.unsign('download', token)
+                lookup = {'pk': file_pk}
+            if str(request.user.pk) != str(user_pk) or request.user.role != 'client':
                 return Response({'message': 'Access denied.'}, status=403)
-            file_obj = FileUpload.objects.get(assignment_id=assignment_id)
-            response = FileResponse(file_obj.file.open('rb'), as_attachment=True, filename=file_obj.file.name)
-            return response
-        except (BadSignature, SignatureExpired, FileUpload.DoesNotExist):
+            # Checked again here so that revoking a grant also voids links already handed out.
+            file_obj = FileUpload.objects.visible_to(request.user).get(**lookup)
+            if check is not None and check != _assignment_check(file_obj.assignment_id):
+                raise FileUpload.DoesNotExist
+            return ranged_file_response(request, open_for_download(file_obj), file_obj.file.name)
+        except (BadSignature, SignatureExpired, ValueError, FileUpload.DoesNotExist):
             return Response({'message': 'Invalid or expired download link.'}, status=400)
+        except FileNotFoundError:
+            return Response({'message': 'File not found.'}, status=404)
+
+# Ops User Create a versioned Document from its first upload
+class OpsDocumentCreateView(UploadAdmissionMixin, views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        if request.user.role != 'ops':
+            return Response({'message': 'Only Ops users can upload documents.'}, status=403)
+        serializer = DocumentUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        with transaction.atomic():
+            document = Document.objects.create(
+                owner=request.user, title=serializer.validated_data.get('title') or upload.name
+            )
+            version = store_version(document, upload, request.user)
+        document.latest_version = version.number
+        return Response({
+            'document': DocumentSerializer(document).data,
+            'version': DocumentVersionSerializer(version).data,
+        }, status=201)
+
+# Ops User Upload a new Version of a Document
+class OpsDocumentVersionCreateView(UploadAdmissionMixin, views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, pk):
+        if request.user.role != 'ops':
+            return Response({'message': 'Only Ops users can upload documents.'}, status=403)
+        try:
+            document = Document.objects.get(pk=pk)
+        except Document.DoesNotExist:
+            return Response({'message': 'Document not found.'}, status=404)
+        serializer = DocumentUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        version = store_version(document, serializer.validated_data['file'], request.user)
+        return Response(DocumentVersionSerializer(version).data, status=201)
+
+# Client User List Documents
+class ClientDocumentListView(generics.ListAPIView):
+    serializer_class = DocumentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Document.objects.visible_to(self.request.user).annotate(
+            latest_version=Max('versions__number')
+        ).order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        if request.user.role != 'client':
+            return Response({'message': 'Only client users can list documents.'}, status=403)
+        return super().list(request, *args, **kwargs)
+
+# Client User List Versions of a Document
+class ClientDocumentVersionListView(generics.ListAPIView):
+    serializer_class = DocumentVersionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return DocumentVersion.objects.visible_to(self.request.user).filter(document_id=self.kwargs['pk']).order_by('-number')
+
+    def list(self, request, *args, **kwargs):
+        if request.user.role != 'client':
+            return Response({'message': 'Only client users can list documents.'}, status=403)
+        return super().list(request, *args, **kwargs)
+
+class ClientDocumentVersionMixin:
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_version(self, request, pk, number):
+        if request.user.role != 'client':
+            return None, Response({'message': 'Only client users can download documents.'}, status=403)
+        try:
+            return DocumentVersion.objects.visible_to(request.user).get(document_id=pk, number=number), None
+        except DocumentVersion.DoesNotExist:
+            return None, Response({'message': 'Version not found.'}, status=404)
+
+# Client User Get the chunk Manifest of a Version
+class ClientDocumentManifestView(ClientDocumentVersionMixin, views.APIView):
+    def get(self, request, pk, number):
+        version, error = self.get_version(request, pk, number)
+        if error:
+            return error
+        chunks = version.chunk_entries.order_by('position').values_list('chunk_id', 'chunk__size', 'offset')
+        return Response({
+            **DocumentVersionSerializer(version).data,
+            'chunks': [{'digest': digest, 'size': size, 'offset': offset} for digest, size, offset in chunks],
+        })
+
+# Client User Download a whole Version, reassembled from its chunks
+class ClientDocumentDownloadView(ClientDocumentVersionMixin, views.APIView):
+    def get(self, request, pk, number):
+        version, error = self.get_version(request, pk, number)
+        if error:
+            return error
+        response = StreamingHttpResponse(iter_version(version), content_type='application/octet-stream')
+        response['Content-Length'] = str(version.size)
+        response['Content-Disposition'] = content_disposition_header(True, version.original_filename)
+        return response
+
+# Client User Download a single Chunk
+class ClientChunkView(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, digest):
+        if request.user.role != 'client':
+            return Response({'message': 'Only client users can download documents.'}, status=403)
+        # Only chunks of a version the client may download.
+        if not Chunk.objects.visible_to(request.user).filter(digest=digest).exists():
+            return Response({'message': 'Chunk not found.'}, status=404)
+        response = HttpResponse(read_chunk(digest), content_type='application/octet-stream')
+        # Chunks are addressed by their content, so they never change.
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
@@ -0,0 +1,117 @@
+"""
+Primary/replica database routing for fileshare.
+
+Reads are spread across the aliases listed in ``DATABASE_REPLICAS`` while
+writes always go to ``default``. A request is pinned to the primary when it
+is not a safe method, when it has written anything, or when the client wrote
+something recently, so users always read their own uploads and verifications.
+Recent writers are remembered by a short-lived cookie and, since API clients
+sending bearer tokens usually drop cookies, by their Authorization header in
+the cache. Use a cache shared by all workers (e.g. Redis) for the latter.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY_DB = 'default'
+
+# Outside of a request (shell, management commands, tests) everything is pinned.
+_pinned = ContextVar('fileshare_db_pinned', default=True)
+_wrote = ContextVar('fileshare_db_wrote', default=False)
+
+
+def pin_to_primary():
+    """Send every following read of the current request to the primary."""
+    _pinned.set(True)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if _pinned.get() or not aliases:
+            return PRIMARY_DB
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any alias can be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
+
+
+class ReplicaPinningMiddleware:
+    """Decide per request whether reads may go to a replica."""
+
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pinned')
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self._pin_key(request)
+        pinned = self._must_pin(request) or (key is not None and cache.get(key) is not None)
+        tokens = _pinned.set(pinned), _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and key is not None:
+                cache.set(key, True, self.pin_seconds)
+            return self._finish(response)
+        finally:
+            self._reset(tokens)
+
+    async def __acall__(self, request):
+        key = self._pin_key(request)
+        pinned = self._must_pin(request) or (key is not None and await cache.aget(key) is not None)
+        tokens = _pinned.set(pinned), _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            if _wrote.get() and key is not None:
+                await cache.aset(key, True, self.pin_seconds)
+            return self._finish(response)
+        finally:
+            self._reset(tokens)
+
+    def _must_pin(self, request):
+        return request.method not in self.safe_methods or self.cookie_name in request.COOKIES
+
+    def _pin_key(self, request):
+        """Cache key pinning this request's credentials, or None without replicas or credentials."""
+        credentials = request.headers.get('Authorization')
+        if not credentials or not replicas():
+            return None
+        return 'db_pinned:' + hashlib.sha256(credentials.encode()).hexdigest()
+
+    def _finish(self, response):
+        if _wrote.get():
+            response.set_cookie(
+                self.cookie_name, '1', max_age=self.pin_seconds,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def _reset(self, tokens):
+        pinned_token, wrote_token = tokens
+        _pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
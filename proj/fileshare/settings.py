@@ -10,11 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# fileshare_common, shared with ez_project, lives at the repository root.
+sys.path.append(str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -52,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'fileshare.db_router.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'fileshare.urls'
@@ -85,9 +91,38 @@ DATABASES = {
         'PASSWORD': 'aaaa1234',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Keep connections open between requests and ping them before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Server-side pooling (psycopg 3 only) replaces persistent connections.
+if os.environ.get('DB_POOL'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {'min_size': 2, 'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10))},
+    }
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1.internal,replica2.internal
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _alias = f'replica{_index}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST': _host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['fileshare.db_router.PrimaryReplicaRouter']
+
+# After a write, the client's reads stay on the primary for this many seconds.
+# Token clients are pinned through the default cache, which must be shared by
+# all workers (e.g. Redis) when replicas are used.
+REPLICA_PIN_COOKIE = 'db_pinned'
+REPLICA_PIN_SECONDS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,6 +161,9 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploads, document chunks and (by default) the cold tier live under MEDIA_ROOT.
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -141,5 +179,51 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'api.User'
 
+# Per-process upload admission (fileshare_common.admission). Set WORKER_THREADS to the
+# server's threads per process so DOWNLOAD_RESERVE of them never take uploads.
+UPLOAD_ADMISSION = {
+    'MAX_CONCURRENT': 8,
+    'MAX_BYTES': 1024 * 1024 * 1024,
+    'PER_USER_CONCURRENT': 2,
+    'PER_USER_BYTES': 200 * 1024 * 1024,
+    'MIN_FREE_BYTES': 2 * 1024 * 1024 * 1024,
+    'WORKER_THREADS': int(os.environ.get('WORKER_THREADS', 0)) or None,
+    'DOWNLOAD_RESERVE': 2,
+    'RETRY_AFTER': 5,
+}
+
+# Storage tiering and retention (api.lifecycle, run `manage.py sweep_storage` from cron).
+# Files not downloaded for COLD_AFTER_DAYS move to COLD_STORAGE_ROOT (MEDIA_ROOT/cold
+# by default) until their next download; RETAIN_DAYS, when set, deletes them. Document
+# chunks no version uses are deleted after ORPHAN_CHUNK_GRACE_HOURS.
+FILE_LIFECYCLE = {
+    'COLD_AFTER_DAYS': 90,
+    'RETAIN_DAYS': int(os.environ.get('FILE_RETAIN_DAYS', 0)) or None,
+    'COLD_STORAGE_ROOT': os.environ.get('COLD_STORAGE_ROOT'),
+    'BATCH_SIZE': 500,
+    'ACCESS_RESOLUTION_MINUTES': 60,
+    'ORPHAN_CHUNK_GRACE_HOURS': 24,
+}
+
+# Keys for download and verification link tokens (api.tokens): {key_id (0-255): secret}.
+# To rotate, add a new key, point TOKEN_ACTIVE_KEY_ID at it, and remove the old
+# key once the links it signed have expired.
+TOKEN_SIGNING_KEYS = {1: SECRET_KEY}
+TOKEN_ACTIVE_KEY_ID = 1
+
+# Master keys for encrypting uploads at rest (api.encryption): {key_id (0-255): base64 32-byte key}.
+# Leave empty to store new uploads in plaintext. To rotate, add a key, point
+# FILE_ENCRYPTION_ACTIVE_KEY_ID at it and run `manage.py rotate_file_keys`.
+FILE_ENCRYPTION_KEYS = {}
+if os.environ.get('FILE_ENCRYPTION_KEY'):
+    FILE_ENCRYPTION_KEYS[1] = os.environ['FILE_ENCRYPTION_KEY']
+FILE_ENCRYPTION_ACTIVE_KEY_ID = 1
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@fileshare.local'
+BASE_URL = 'http://localhost:8000'  # Used for links in emails sent outside a request
+
+# Password hashing processes for /api/admin/import-clients/. Kept small since they
+# share the machine with the web workers; `manage.py import_clients` uses every CPU.
+CLIENT_IMPORT_REQUEST_WORKERS = 2
+
@@ -0,0 +1,40 @@
+"""
+API-only deployment profile: DJANGO_SETTINGS_MODULE=fileshare.settings_api.
+
+The API authenticates every request with a bearer token, so the session,
+CSRF, message and clickjacking middlewares only cost time, and the admin,
+sessions, messages and staticfiles apps only cost startup. Run the admin
+from a separate deployment on ``fileshare.settings``.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    )
+]
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'fileshare.db_router.ReplicaPinningMiddleware',
+]
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {'context_processors': ['django.template.context_processors.request']},
+    },
+]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    # The browsable API needs sessions and templates; clients only want JSON.
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+}
@@ -0,0 +1,21 @@
+"""
+Test profile: ``python manage.py test --settings=fileshare.settings_test``.
+
+Runs on SQLite, so no Postgres server is needed, with a ``replica1`` alias
+that mirrors ``default`` during tests. Reads routed to the replica then hit
+the same database over a second connection, which is what the router tests
+in ``api.tests.test_db_router`` check.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+}
+DATABASES['replica1'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = ['replica1']
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
@@ -14,9 +14,9 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path
-from api import views
+from api import feed, views
 from django.http import HttpResponse
 
 def homepage(request):
@@ -25,14 +25,35 @@ def homepage(request):
 urlpatterns = [
     path('', homepage, name='homepage'),
     # Client User
-    path('admin/', admin.site.urls),
     path('api/client/signup/', views.ClientSignUpView.as_view(), name='client-signup'),
     path('api/client/verify-email/', views.ClientVerifyEmailView.as_view(), name='client-verify-email'),
     path('api/client/login/', views.UserLoginView.as_view(), name='client-login'),
     path('api/client/files/', views.ClientFileListView.as_view(), name='client-list-files'),
+    path('api/client/files/changes/', views.ClientFileChangesView.as_view(), name='client-file-changes'),
+    path('api/client/files/changes/poll/', feed.file_change_poll, name='client-file-changes-poll'),
+    path('api/client/files/changes/stream/', feed.file_change_stream, name='client-file-changes-stream'),
+    path('api/client/files/changes/stream-link/', views.ClientFileChangeStreamLinkView.as_view(), name='client-file-changes-stream-link'),
     path('api/client/download/<str:assignment_id>/', views.ClientDownloadLinkView.as_view(), name='client-download-link'),
+    path('api/client/download-links/', views.ClientBatchDownloadLinkView.as_view(), name='client-download-links'),
     path('api/client/download-file/<str:token>/', views.ClientDownloadFileView.as_view(), name='client-download-file'),
+    path('api/client/documents/', views.ClientDocumentListView.as_view(), name='client-list-documents'),
+    path('api/client/documents/<int:pk>/versions/', views.ClientDocumentVersionListView.as_view(), name='client-document-versions'),
+    path('api/client/documents/<int:pk>/versions/<int:number>/manifest/', views.ClientDocumentManifestView.as_view(), name='client-document-manifest'),
+    path('api/client/documents/<int:pk>/versions/<int:number>/download/', views.ClientDocumentDownloadView.as_view(), name='client-document-download'),
+    path('api/client/chunks/<str:digest>/', views.ClientChunkView.as_view(), name='client-chunk'),
+    # Admin
+    path('api/admin/import-clients/', views.ClientImportView.as_view(), name='admin-import-clients'),
     # Ops User
     path('api/ops/login/', views.UserLoginView.as_view(), name='ops-login'),
     path('api/ops/upload/', views.OpsFileUploadView.as_view(), name='ops-upload'),
+    path('api/ops/grants/', views.OpsFileGrantView.as_view(), name='ops-grant-files'),
+    path('api/ops/grants/revoke/', views.OpsFileGrantView.as_view(revoke=True), name='ops-revoke-files'),
+    path('api/ops/documents/', views.OpsDocumentCreateView.as_view(), name='ops-create-document'),
+    path('api/ops/documents/<int:pk>/versions/', views.OpsDocumentVersionCreateView.as_view(), name='ops-upload-document-version'),
 ]
+
+# The API-only profile (fileshare.settings_api) leaves the admin out.
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
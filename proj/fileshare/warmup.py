@@ -0,0 +1,50 @@
+"""
+Pre-fork warm-up for WSGI/ASGI workers.
+
+Django builds URL resolvers, DRF reads its settings and serializers build
+their fields on first use, so without this the first requests to every new
+worker pay for it. ``warm_up()`` does that work once, in the master process
+when the app is preloaded (see ``gunicorn.conf.py``), and forked workers
+inherit the result. It also imports the modules the views import on first
+use, so they only stay deferred for processes that never serve requests.
+"""
+import importlib
+
+from django.db import connections
+from django.urls import URLPattern, get_resolver
+
+# Imported on first use by the views; see api.views.ClientImportView.
+DEFERRED_MODULES = (
+    'api.onboarding',
+)
+
+
+def _views(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            yield getattr(pattern.callback, 'view_class', None)
+        else:
+            yield from _views(pattern.url_patterns)
+
+
+def warm_up():
+    from rest_framework.settings import api_settings
+
+    from fileshare_common import tokens
+
+    resolver = get_resolver()
+    # Builds the reverse and namespace dicts as well as the pattern list.
+    resolver.reverse_dict
+    resolver.namespace_dict
+    for setting in ('DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES',
+                    'DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES'):
+        getattr(api_settings, setting)
+    for view in filter(None, _views(resolver.url_patterns)):
+        serializer_class = getattr(view, 'serializer_class', None)
+        if serializer_class is not None:
+            serializer_class().fields
+    for module in DEFERRED_MODULES:
+        importlib.import_module(module)
+    tokens._load_keyring()
+    # Workers must not share the master's sockets.
+    connections.close_all()
@@ -0,0 +1,33 @@
+"""
+gunicorn settings for the API: ``gunicorn -c gunicorn.conf.py fileshare.wsgi``.
+
+The app is loaded and warmed once in the master and workers are forked
+from it, so a new worker can serve its first request straight away. With
+``GUNICORN_PRELOAD=0`` (e.g. for code reloads) each worker warms up itself.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fileshare.settings_api')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2 * os.cpu_count() + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Upload admission caps uploads at WORKER_THREADS - DOWNLOAD_RESERVE.
+os.environ.setdefault('WORKER_THREADS', str(threads))
+
+
+def when_ready(server):
+    if preload_app:
+        from fileshare.warmup import warm_up
+
+        warm_up()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from fileshare.warmup import warm_up
+
+        warm_up()